@@ -1,5 +1,11 @@
+import collections
+import concurrent.futures
+import json
 import os
+import struct
+import threading
 import time
+import zipfile
 
 import numpy as np
 import vtk, qt, ctk, slicer
@@ -46,7 +52,12 @@ import pandas as pd
 from mlxtend.plotting import plot_decision_regions
 from sklearn.decomposition import PCA
 from sklearn.manifold import TSNE
+import joblib
 from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import GridSearchCV, StratifiedKFold
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
 from scipy.fft import fft, ifft, rfft, rfftfreq
 from scipy.signal import detrend, resample
 
@@ -128,6 +139,445 @@ def registerSampleData():
     nodeNames='CauteryClassification2'
   )
 
+#
+# Scope display
+#
+
+def decimateMinMax(values, binSize, out, keepFirst=False):
+  """
+  Reduces a trace for display by keeping the minimum and maximum of every bin of binSize samples, so that peaks
+  stay visible. Results are written into out, which must hold 2 * (len(values) // binSize) values
+  (or len(values) when binSize is 1).
+  :param keepFirst: bool, write the first and last value of each bin instead of min/max (for the time axis)
+  """
+  if binSize <= 1:
+    np.copyto(out, values, casting="unsafe")
+    return out
+  numberOfBins = len(values) // binSize
+  bins = np.asarray(values)[:numberOfBins * binSize].reshape(numberOfBins, binSize)
+  if keepFirst:
+    out[0::2] = bins[:, 0]
+    out[1::2] = bins[:, -1]
+  else:
+    out[0::2] = bins.min(axis=1)
+    out[1::2] = bins.max(axis=1)
+  return out
+
+#
+# CauteryFeatureExtractor
+#
+
+class CauteryFeatureExtractor:
+  """
+  Computes all oscilloscope features of one or many scope frames in a single pass.
+  The signal is detrended and transformed once. Resampling to resampledLength samples is done in the frequency
+  domain on that same transform, which gives the same spectrum as scipy.signal.resample followed by rfft.
+  The frequency axis is computed once and reused for every frame.
+  """
+
+  FEATURE_NAMES = ["lmrSum", "maximumB", "fftPeak", "fftPeakFrequency", "absSumA", "absSumB", "maximumA"]
+  LMR_SUM = 0
+  MAXIMUM_B = 1
+  FFT_PEAK = 2
+  FFT_PEAK_FREQUENCY = 3
+  ABS_SUM_A = 4
+  ABS_SUM_B = 5
+  MAXIMUM_A = 6
+
+  def __init__(self, numberOfSamples=3900, samplingRate=4e3, duration=0.1):
+    self.numberOfSamples = numberOfSamples
+    self.samplingRate = samplingRate
+    self.resampledLength = int(samplingRate * duration)
+    self.frequencies = rfftfreq(self.resampledLength, 1 / samplingRate)
+    self._numberOfBins = self.resampledLength // 2 + 1
+    self._scale = float(self.resampledLength) / float(numberOfSamples)
+    # When downsampling to an even length, scipy.signal.resample doubles the Nyquist bin and irfft keeps only its real part
+    self._doubleNyquist = self.resampledLength < numberOfSamples and self.resampledLength % 2 == 0
+
+  def spectrum(self, channel):
+    """
+    Returns the magnitude spectrum of the detrended, resampled channel.
+    :param channel: numpy array of shape (numberOfSamples,) or (n, numberOfSamples)
+    :returns: numpy array of shape (n, resampledLength // 2 + 1)
+    """
+    channel = np.atleast_2d(np.asarray(channel, dtype=np.float64))
+    detrended = detrend(channel, axis=-1)
+    if self.resampledLength >= channel.shape[-1]:
+      return np.abs(rfft(resample(detrended, self.resampledLength, axis=-1), axis=-1))
+    transform = rfft(detrended, axis=-1, workers=-1)[:, :self._numberOfBins]
+    if self._doubleNyquist:
+      transform[:, -1] = 2 * transform[:, -1].real
+    magnitude = np.abs(transform)
+    magnitude *= self._scale
+    return magnitude
+
+  def fftPeak(self, channel):
+    """
+    Returns the peak magnitude of the spectrum and the frequency where it occurs, one value per frame.
+    """
+    magnitude = self.spectrum(channel)
+    peakIndices = np.argmax(magnitude, axis=-1)
+    peaks = magnitude[np.arange(len(magnitude)), peakIndices]
+    return peaks, self.frequencies[peakIndices]
+
+  def extract(self, channelA, channelB):
+    """
+    Computes the full feature vector of every frame, with columns in FEATURE_NAMES order.
+    :param channelA: numpy array of shape (numberOfSamples,) or (n, numberOfSamples)
+    :param channelB: numpy array of the same shape as channelA
+    :returns: numpy array of shape (n, len(FEATURE_NAMES))
+    """
+    channelA = np.atleast_2d(np.asarray(channelA, dtype=np.float64))
+    channelB = np.atleast_2d(np.asarray(channelB, dtype=np.float64))
+    features = np.empty((len(channelA), len(self.FEATURE_NAMES)))
+    features[:, self.ABS_SUM_A] = np.abs(channelA).sum(axis=-1)
+    features[:, self.ABS_SUM_B] = np.abs(channelB).sum(axis=-1)
+    features[:, self.LMR_SUM] = features[:, self.ABS_SUM_B] - features[:, self.ABS_SUM_A]
+    features[:, self.MAXIMUM_A] = channelA.max(axis=-1)
+    features[:, self.MAXIMUM_B] = channelB.max(axis=-1)
+    features[:, self.FFT_PEAK], features[:, self.FFT_PEAK_FREQUENCY] = self.fftPeak(channelA)
+    return features
+
+#
+# Scope datasets
+#
+
+def loadScopeDataset(fileName, mmap=True):
+  """
+  Loads a scope dataset written by CauteryClassificationLogic.exportScopeDataset.
+  Arrays of uncompressed files are memory-mapped, so large recordings are only read from disk when accessed.
+  :param fileName: str, .npz dataset file
+  :param mmap: bool, memory-map arrays when possible
+  :returns: dict of numpy arrays
+  """
+  dataset = {}
+  with zipfile.ZipFile(fileName) as archive, open(fileName, "rb") as datasetFile:
+    for info in archive.infolist():
+      name = os.path.splitext(info.filename)[0]
+      if not mmap or info.compress_type != zipfile.ZIP_STORED:
+        with archive.open(info) as memberFile:
+          dataset[name] = np.lib.format.read_array(memberFile)
+        continue
+      # Stored members are plain .npy files inside the archive, find the start of their data
+      datasetFile.seek(info.header_offset)
+      localHeader = datasetFile.read(30)
+      nameLength, extraLength = struct.unpack("<HH", localHeader[26:30])
+      datasetFile.seek(info.header_offset + 30 + nameLength + extraLength)
+      version = np.lib.format.read_magic(datasetFile)
+      if version == (1, 0):
+        shape, fortranOrder, dtype = np.lib.format.read_array_header_1_0(datasetFile)
+      else:
+        shape, fortranOrder, dtype = np.lib.format.read_array_header_2_0(datasetFile)
+      if dtype.hasobject or 0 in shape:
+        with archive.open(info) as memberFile:
+          dataset[name] = np.lib.format.read_array(memberFile)
+        continue
+      dataset[name] = np.memmap(fileName, dtype=dtype, mode="r", shape=shape, order="F" if fortranOrder else "C",
+                                offset=datasetFile.tell())
+  return dataset
+
+#
+# CauteryModelTrainer
+#
+
+class CauteryModelTrainer:
+  """
+  Trains cautery classifiers from labelled scope recordings.
+  Features of all classes are extracted in parallel, then SVM, random forest and linear models are grid searched
+  with stratified k-fold cross-validation. Cross-validation folds and parameter sets run in parallel with joblib,
+  on its threading backend because Slicer cannot spawn worker processes from the application.
+  """
+
+  CANDIDATE_MODELS = {
+    "SVM": (lambda: Pipeline([("scale", StandardScaler()), ("model", svm.SVC(decision_function_shape='ovo'))]),
+            {"model__kernel": ["linear", "rbf"], "model__C": [0.1, 1.0, 10.0]}),
+    "RF": (lambda: RandomForestClassifier(),
+           {"n_estimators": [50, 100, 200], "max_depth": [None, 10]}),
+    "Linear": (lambda: Pipeline([("scale", StandardScaler()), ("model", LogisticRegression(max_iter=1000))]),
+               {"model__C": [0.1, 1.0, 10.0]}),
+  }
+
+  def __init__(self, featureExtractor, featureNames, numberOfFolds=5, numberOfJobs=-1):
+    self.featureExtractor = featureExtractor
+    self.featureNames = list(featureNames)
+    self.numberOfFolds = numberOfFolds
+    self.numberOfJobs = numberOfJobs
+
+  def extractFeatures(self, scopeDataByClass):
+    """
+    Extracts the training features of all classes in parallel.
+    Threads are used instead of processes because Slicer cannot spawn worker processes from the application
+    and the NumPy/SciPy transforms release the GIL.
+    :param scopeDataByClass: dict, class name to (scope data, label)
+    :returns: features of shape (n, len(featureNames)) and labels of shape (n,)
+    """
+    columns = [CauteryFeatureExtractor.FEATURE_NAMES.index(featureName) for featureName in self.featureNames]
+
+    def extractClass(item):
+      scopeData, label = item
+      features = self.featureExtractor.extract(scopeData["channelA"], scopeData["channelB"])[:, columns]
+      return features, np.full(len(features), label)
+
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+      results = list(executor.map(extractClass, scopeDataByClass.values()))
+    features = np.concatenate([features for features, _ in results])
+    labels = np.concatenate([labels for _, labels in results])
+    return features, labels
+
+  def train(self, features, labels):
+    """
+    Grid searches all candidate models with cross-validation and refits the best one on all data.
+    :returns: dict with "bestModelName", "bestModel" and per model "models" metrics
+    """
+    smallestClassSize = np.min(np.unique(labels, return_counts=True)[1])
+    numberOfFolds = max(2, min(self.numberOfFolds, smallestClassSize))
+    crossValidation = StratifiedKFold(n_splits=numberOfFolds, shuffle=True)
+    result = {"models": {}, "bestModelName": None, "bestModel": None, "numberOfFolds": numberOfFolds}
+    bestAccuracy = -1.0
+    for modelName, (createModel, parameterGrid) in self.CANDIDATE_MODELS.items():
+      search = GridSearchCV(createModel(), parameterGrid, cv=crossValidation, n_jobs=self.numberOfJobs)
+      # The default loky backend would start worker processes
+      with joblib.parallel_backend("threading"):
+        search.fit(features, labels)
+      result["models"][modelName] = {
+        "meanAccuracy": float(search.best_score_),
+        "stdAccuracy": float(search.cv_results_["std_test_score"][search.best_index_]),
+        "bestParameters": {key: str(value) for key, value in search.best_params_.items()},
+      }
+      if search.best_score_ > bestAccuracy:
+        bestAccuracy = search.best_score_
+        result["bestModelName"] = modelName
+        result["bestModel"] = search.best_estimator_
+    return result
+
+  def save(self, modelFileName, result, classNames):
+    """
+    Saves the best model and, next to it, a .json file with its metrics and feature schema.
+    :param classNames: dict, label to class name
+    """
+    with open(modelFileName, "wb") as modelFile:
+      pickle.dump(result["bestModel"], modelFile)
+    metadata = {
+      "modelName": result["bestModelName"],
+      "featureNames": self.featureNames,
+      "classNames": {str(label): className for label, className in classNames.items()},
+      "numberOfFolds": result["numberOfFolds"],
+      "models": result["models"],
+    }
+    with open(os.path.splitext(modelFileName)[0] + ".json", "w") as metadataFile:
+      json.dump(metadata, metadataFile, indent=2)
+
+#
+# CauteryModelRegistry
+#
+
+class CauteryModelRegistry:
+  """
+  Keeps trained cautery classifiers loaded between oscilloscope frames.
+  Each model is unpickled once and only reloaded when its file modification time changes.
+  """
+
+  def __init__(self):
+    self.modelFiles = {}
+    self.modelFeatureNames = {}
+    self.activeModelNames = []
+    self.lastLatencies = {}
+    self.totalLatencies = {}
+    self.predictionCounts = {}
+    self._models = {}
+    self._modelTimes = {}
+
+  def registerModel(self, name, fileName, featureNames, active=True):
+    """
+    Adds a model file to the registry. The file is loaded on first use.
+    :param name: str, name used to select the model and report its predictions
+    :param fileName: str, full path to the pickled model
+    :param featureNames: list of str, CauteryFeatureExtractor.FEATURE_NAMES the model was trained on, in order
+    :param active: bool, whether the model runs in predict()
+    """
+    self.modelFiles[name] = fileName
+    self.modelFeatureNames[name] = list(featureNames)
+    self._models.pop(name, None)
+    self._modelTimes.pop(name, None)
+    if active and name not in self.activeModelNames:
+      self.activeModelNames.append(name)
+
+  def setActiveModels(self, names):
+    """
+    Selects which registered models run in predict().
+    :param names: list of str, registered model names
+    """
+    unknownNames = [name for name in names if name not in self.modelFiles]
+    if unknownNames:
+      raise ValueError("Unknown cautery models: {}".format(", ".join(unknownNames)))
+    self.activeModelNames = list(names)
+
+  def getModel(self, name):
+    """
+    Returns the loaded model, reloading it if the file changed since it was last loaded.
+    :param name: str, registered model name
+    """
+    fileName = self.modelFiles[name]
+    modifiedTime = os.path.getmtime(fileName)
+    if self._modelTimes.get(name) != modifiedTime:
+      with open(fileName, "rb") as modelFile:
+        self._models[name] = pickle.load(modelFile)
+      self._modelTimes[name] = modifiedTime
+      logging.info("Loaded cautery model {} from {}".format(name, fileName))
+    return self._models[name]
+
+  def predict(self, features, names=None):
+    """
+    Runs models on the features. Each model gets the feature columns it was trained on.
+    Prediction latency of each call is recorded per model.
+    :param features: numpy array of shape (n, len(CauteryFeatureExtractor.FEATURE_NAMES))
+    :param names: list of str, registered models to run, all active models if None
+    :returns: dict, model name to predicted labels
+    """
+    predictions = {}
+    for name in (self.activeModelNames if names is None else names):
+      model = self.getModel(name)
+      columns = [CauteryFeatureExtractor.FEATURE_NAMES.index(featureName) for featureName in self.modelFeatureNames[name]]
+      startTime = time.perf_counter()
+      predictions[name] = model.predict(features[:, columns])
+      latency = time.perf_counter() - startTime
+      self.lastLatencies[name] = latency
+      self.totalLatencies[name] = self.totalLatencies.get(name, 0.0) + latency
+      self.predictionCounts[name] = self.predictionCounts.get(name, 0) + 1
+    return predictions
+
+  def getMeanLatency(self, name):
+    """
+    Returns the mean prediction latency of a model in seconds, or None if it has not run yet.
+    """
+    count = self.predictionCounts.get(name, 0)
+    if count == 0:
+      return None
+    return self.totalLatencies[name] / count
+
+#
+# CauteryStateClassifier
+#
+
+class CauteryStateClassifier:
+  """
+  Classifies the cautery state from a stream of oscilloscope frames.
+  Incoming frames are only copied into a ring buffer. At each update, features of the frames that arrived since
+  the last update are computed in one batch and classified. The reported state is the majority label of the most
+  recent windowSize frames, and it only changes after the new majority held for debounceCount updates.
+  Only the state model is run on each update; other active models of the registry are not.
+  """
+
+  def __init__(self, featureExtractor, modelRegistry, classNames, windowSize=8, debounceCount=2, stateModelName=None):
+    """
+    :param featureExtractor: CauteryFeatureExtractor
+    :param modelRegistry: CauteryModelRegistry
+    :param stateModelName: str, registered model whose labels drive the state, the first active model if None
+    :param classNames: dict, label to class name
+    :param windowSize: int, number of recent frames that vote on the state
+    :param debounceCount: int, number of consecutive updates a new state must win before it is reported
+    """
+    self.featureExtractor = featureExtractor
+    self.modelRegistry = modelRegistry
+    self.stateModelName = stateModelName
+    self.classNames = classNames
+    self.windowSize = windowSize
+    self.debounceCount = debounceCount
+    numberOfSamples = featureExtractor.numberOfSamples
+    self._channelA = np.zeros((windowSize, numberOfSamples))
+    self._channelB = np.zeros((windowSize, numberOfSamples))
+    self._arrivalTimes = np.zeros(windowSize)
+    self._labels = [None] * windowSize
+    self._nextIndex = 0
+    self._pendingCount = 0
+    self._candidateState = None
+    self._candidateCount = 0
+    self.state = None
+    self.resetCounters()
+
+  def resetCounters(self):
+    self.framesReceived = 0
+    self.framesClassified = 0
+    self.framesSkipped = 0
+    self.totalLatency = 0.0
+    self.lastUpdateDuration = 0.0
+    self._counterStartTime = time.perf_counter()
+
+  def addFrame(self, channelA, channelB):
+    """
+    Copies one oscilloscope frame into the ring buffer. Cheap enough to call on every scope update.
+    """
+    index = self._nextIndex
+    self._channelA[index] = channelA
+    self._channelB[index] = channelB
+    self._arrivalTimes[index] = time.perf_counter()
+    self._nextIndex = (index + 1) % self.windowSize
+    self.framesReceived += 1
+    if self._pendingCount == self.windowSize:
+      self.framesSkipped += 1
+    self._pendingCount = min(self._pendingCount + 1, self.windowSize)
+
+  def update(self):
+    """
+    Classifies pending frames and updates the debounced state.
+    :returns: True if the reported state changed
+    """
+    modelName = self.getStateModelName()
+    if self._pendingCount == 0 or modelName is None:
+      return False
+    startTime = time.perf_counter()
+    pendingIndices = (self._nextIndex - self._pendingCount + np.arange(self._pendingCount)) % self.windowSize
+    features = self.featureExtractor.extract(self._channelA[pendingIndices], self._channelB[pendingIndices])
+    predictions = self.modelRegistry.predict(features, [modelName])
+    for index, label in zip(pendingIndices, predictions[modelName]):
+      self._labels[index] = label.item() if hasattr(label, "item") else label
+    endTime = time.perf_counter()
+    self.totalLatency += float(np.sum(endTime - self._arrivalTimes[pendingIndices]))
+    self.framesClassified += self._pendingCount
+    self._pendingCount = 0
+    self.lastUpdateDuration = endTime - startTime
+
+    votes = collections.Counter(label for label in self._labels if label is not None)
+    majorityLabel = votes.most_common(1)[0][0]
+    majorityState = self.classNames.get(majorityLabel, str(majorityLabel))
+    if majorityState == self.state:
+      self._candidateState = None
+      self._candidateCount = 0
+      return False
+    if majorityState != self._candidateState:
+      self._candidateState = majorityState
+      self._candidateCount = 0
+    self._candidateCount += 1
+    if self.state is not None and self._candidateCount < self.debounceCount:
+      return False
+    self.state = majorityState
+    self._candidateState = None
+    self._candidateCount = 0
+    return True
+
+  def getStateModelName(self):
+    """
+    Returns the name of the model whose labels drive the state, or None if there is none.
+    """
+    if self.stateModelName is not None:
+      return self.stateModelName
+    return self.modelRegistry.activeModelNames[0] if self.modelRegistry.activeModelNames else None
+
+  def getStatistics(self):
+    """
+    Returns throughput and latency counters since the last reset.
+    """
+    elapsedTime = max(time.perf_counter() - self._counterStartTime, 1e-6)
+    meanLatency = self.totalLatency / self.framesClassified if self.framesClassified else 0.0
+    return {
+      "framesReceived": self.framesReceived,
+      "framesClassified": self.framesClassified,
+      "framesSkipped": self.framesSkipped,
+      "classifiedFramesPerSecond": self.framesClassified / elapsedTime,
+      "meanLatencySeconds": meanLatency,
+      "lastUpdateSeconds": self.lastUpdateDuration,
+    }
+
 #
 # CauteryClassificationWidget
 #
@@ -375,6 +825,10 @@ class CauteryClassificationLogic(ScriptedLoadableModuleLogic, VTKObservationMixi
   CHA_CHARTNODE = "ChannelAScopePlotChartNode"
   CHA_ARRAYNODE = "ChannelAArrayNode"
   CHA_ARRAY = "ChannelAArray"
+  CHA_SERIESNODE = "ChannelAPlotSeriesNode"
+  SCOPE_TIME_ARRAY = "Time"
+  SCOPE_DISPLAY_FPS = 10
+  SCOPE_DISPLAY_POINTS = 1000  # Traces are min/max decimated to about this many points
 
   SCOPE_OFF_VOLUME_A = "ScopeOffVolumeA"
   SCOPE_CUT_AIR_VOLUME_A = "ScopeCutAirVolumeA"
@@ -394,6 +848,38 @@ class CauteryClassificationLogic(ScriptedLoadableModuleLogic, VTKObservationMixi
   COLLECT_COAG_AIR_SEQUENCE_BROWSER = "CollectCoagAirSequenceBrowser"
   COLLECT_COAG_TISSUE_SEQUENCE_BROWSER = "CollectCoagTissueSequenceBrowser"
 
+  DATASET_DIRECTORY_SETTING = "CauteryClassification/DatasetDirectory"
+
+  # Streaming cautery state
+
+  CAUTERY_STATE_TEXT_NODE = "CauteryState"
+  CAUTERY_STATE_PARAMETER = "CauteryState"
+  CAUTERY_STATE_MODEL_PARAMETER = "CauteryStateModel"
+  CAUTERY_STATE_UPDATE_RATE_HZ = 10
+  CAUTERY_STATE_WINDOW_SIZE = 8
+  CAUTERY_STATE_DEBOUNCE_COUNT = 2
+
+  # Cautery classifier models
+
+  MODEL_SVM = "SVM"
+  MODEL_RF = "RF"
+  MODEL_SVM_FILE = "April1_apple_40W_20000_SVM.sav"
+  MODEL_RF_FILE = "April1_apple_40W_20000_RF.sav"
+  MODEL_TRAINED = "Trained"
+  MODEL_TRAINED_FILE = "CauteryModel.sav"
+  PRETRAINED_MODEL_FEATURES = ["maximumA", "fftPeak", "fftPeakFrequency"]
+  TRAINING_FEATURES = ["fftPeak", "fftPeakFrequency", "absSumA"]
+
+  # Training classes: (class name, sequence browser reference, label)
+
+  SCOPE_CLASSES = [
+    ("Off", COLLECT_OFF_SEQUENCE_BROWSER, 0),
+    ("CutAir", COLLECT_CUT_AIR_SEQUENCE_BROWSER, 1),
+    ("CutTissue", COLLECT_CUT_TISSUE_SEQUENCE_BROWSER, 2),
+    ("CoagAir", COLLECT_COAG_AIR_SEQUENCE_BROWSER, 3),
+    ("CoagTissue", COLLECT_COAG_TISSUE_SEQUENCE_BROWSER, 4),
+  ]
+
   def __init__(self):
     """
     Called when the logic class is instantiated. Can be used for initializing member variables.
@@ -402,6 +888,28 @@ class CauteryClassificationLogic(ScriptedLoadableModuleLogic, VTKObservationMixi
     slicer.mymodL = self
     VTKObservationMixin.__init__(self)
 
+    self.featureExtractor = CauteryFeatureExtractor()
+
+    modelsPath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Models")
+    self.modelRegistry = CauteryModelRegistry()
+    self.modelRegistry.registerModel(self.MODEL_SVM, os.path.join(modelsPath, self.MODEL_SVM_FILE),
+                                     self.PRETRAINED_MODEL_FEATURES)
+    self.modelRegistry.registerModel(self.MODEL_RF, os.path.join(modelsPath, self.MODEL_RF_FILE),
+                                     self.PRETRAINED_MODEL_FEATURES)
+    self.trainingThread = None
+    self.trainingResult = None
+    self.trainingModelFileName = None
+    self.trainingTimer = None
+
+    classNames = {label: className for className, _, label in self.SCOPE_CLASSES}
+    self.cauteryStateClassifier = CauteryStateClassifier(self.featureExtractor, self.modelRegistry, classNames,
+                                                         self.CAUTERY_STATE_WINDOW_SIZE,
+                                                         self.CAUTERY_STATE_DEBOUNCE_COUNT)
+    self.cauteryStateTimer = None
+
+    self._scopeRedrawPending = False
+    self._lastScopeRedrawTime = 0.0
+
   def resourcePath(self, filename):
     """
     Returns the full path to the given resource file.
@@ -684,29 +1192,82 @@ class CauteryClassificationLogic(ScriptedLoadableModuleLogic, VTKObservationMixi
     #TODO: create parameter node reference for arrays.
     return time, ChA, ChB
 
-  def scopeSignalModified(self, caller, eventid):
+  def setupScopePlot(self):
+    """
+    Creates the table, plot series and chart of the live scope view once, and shows the chart in the layout.
+    :returns: vtkMRMLTableNode holding the displayed trace
+    """
+    parameterNode = self.getParameterNode()
+    tableNode = parameterNode.GetNodeReference(self.CHA_ARRAYNODE)
+    if tableNode is not None:
+      return tableNode
+
+    tableNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLTableNode", self.CHA_ARRAYNODE)
+    tableNode.SaveWithSceneOff()
+    for columnName in [self.SCOPE_TIME_ARRAY, self.CHA_ARRAY]:
+      column = vtk.vtkDoubleArray()
+      column.SetName(columnName)
+      tableNode.GetTable().AddColumn(column)
+    parameterNode.SetNodeReferenceID(self.CHA_ARRAYNODE, tableNode.GetID())
+
+    seriesNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLPlotSeriesNode", self.CHA_SERIESNODE)
+    seriesNode.SaveWithSceneOff()
+    seriesNode.SetAndObserveTableNodeID(tableNode.GetID())
+    seriesNode.SetXColumnName(self.SCOPE_TIME_ARRAY)
+    seriesNode.SetYColumnName(self.CHA_ARRAY)
+    seriesNode.SetPlotType(slicer.vtkMRMLPlotSeriesNode.PlotTypeScatter)
+    seriesNode.SetMarkerStyle(slicer.vtkMRMLPlotSeriesNode.MarkerStyleNone)
+    parameterNode.SetNodeReferenceID(self.CHA_SERIESNODE, seriesNode.GetID())
+
+    chartNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLPlotChartNode", self.CHA_CHARTNODE)
+    chartNode.SaveWithSceneOff()
+    chartNode.AddAndObservePlotSeriesNodeID(seriesNode.GetID())
+    chartNode.SetXAxisTitle("time (us)")
+    chartNode.SetYAxisTitle("Voltage (V)")
+    chartNode.SetLegendVisibility(False)
+    parameterNode.SetNodeReferenceID(self.CHA_CHARTNODE, chartNode.GetID())
 
-    #logging.info('scopeSignalModified')
-    plotchart = slicer.mrmlScene.GetFirstNodeByClass('vtkMRMLPlotChartNode')
-    plotseries = slicer.mrmlScene.GetFirstNodeByClass('vtkMRMLPlotSeriesNode')
-    table = slicer.mrmlScene.GetFirstNodeByClass('vtkMRMLTableNode')
-    slicer.mrmlScene.RemoveNode(plotchart)
-    slicer.mrmlScene.RemoveNode(plotseries)
-    slicer.mrmlScene.RemoveNode(table)
-    time, ChA, ChB = self.getOscilloscopeChannels()
-    ChA_Array = np.array([time, ChA])
-    ChA_Array = np.transpose(ChA_Array)
-    ChA_ChartNode = slicer.util.plot(ChA_Array, 0)
     layoutManager = slicer.app.layoutManager()
     layoutWithPlot = slicer.modules.plots.logic().GetLayoutWithPlot(layoutManager.layout)
     layoutManager.setLayout(layoutWithPlot)
-    plotWidget = layoutManager.plotWidget(0)
-    plotViewNode = plotWidget.mrmlPlotViewNode()
-    plotViewNode.SetPlotChartNodeID(ChA_ChartNode.GetID())
+    plotViewNode = layoutManager.plotWidget(0).mrmlPlotViewNode()
+    plotViewNode.SetPlotChartNodeID(chartNode.GetID())
+    return tableNode
 
-    import time
-    print("time:", time.time())
+  def scopeSignalModified(self, caller, eventid):
+    # Redraws are throttled to SCOPE_DISPLAY_FPS. Updates arriving in between are coalesced into one delayed redraw.
+    if self._scopeRedrawPending:
+      return
+    elapsedTime = time.perf_counter() - self._lastScopeRedrawTime
+    minimumInterval = 1.0 / self.SCOPE_DISPLAY_FPS
+    if elapsedTime >= minimumInterval:
+      self.updateScopePlot()
+    else:
+      self._scopeRedrawPending = True
+      qt.QTimer.singleShot(int((minimumInterval - elapsedTime) * 1000), self.updateScopePlot)
 
+  def updateScopePlot(self):
+    """
+    Writes the latest scope trace into the existing table columns in place and marks them modified.
+    """
+    self._scopeRedrawPending = False
+    self._lastScopeRedrawTime = time.perf_counter()
+    tableNode = self.setupScopePlot()
+    scopeTime, ChA, ChB = self.getOscilloscopeChannels()
+    binSize = max(1, int(np.ceil(2 * len(ChA) / self.SCOPE_DISPLAY_POINTS)))
+    numberOfPoints = 2 * (len(ChA) // binSize) if binSize > 1 else len(ChA)
+
+    table = tableNode.GetTable()
+    if table.GetNumberOfRows() != numberOfPoints:
+      table.SetNumberOfRows(numberOfPoints)
+    timeColumn = table.GetColumnByName(self.SCOPE_TIME_ARRAY)
+    channelColumn = table.GetColumnByName(self.CHA_ARRAY)
+    decimateMinMax(scopeTime, binSize, numpy_support.vtk_to_numpy(timeColumn), keepFirst=True)
+    decimateMinMax(ChA, binSize, numpy_support.vtk_to_numpy(channelColumn))
+    timeColumn.Modified()
+    channelColumn.Modified()
+    table.Modified()
+    tableNode.Modified()
 
   def setStreamGraphButton(toggled):
     logging.info('setStreamGraphButton')
@@ -755,347 +1316,194 @@ class CauteryClassificationLogic(ScriptedLoadableModuleLogic, VTKObservationMixi
     sequenceBrowserUltrasound = parameterNode.GetNodeReference(self.COLLECT_COAG_TISSUE_SEQUENCE_BROWSER)
     sequenceBrowserUltrasound.SetRecordingActive(recording)  # stop
 
-  def setTrainAndImplementModel(self):
-    logging.info("setTrainAndImplementModel")
+  def getDatasetDirectory(self):
+    """
+    Returns the directory scope datasets are exported to, creating it if needed.
+    """
+    defaultDirectory = os.path.join(slicer.app.defaultScenePath, "CauteryScopeDatasets")
+    datasetDirectory = slicer.util.settingsValue(self.DATASET_DIRECTORY_SETTING, defaultDirectory)
+    os.makedirs(datasetDirectory, exist_ok=True)
+    return datasetDirectory
+
+  def readScopeSequence(self, sequenceBrowserNode):
+    """
+    Reads all recorded oscilloscope frames of a sequence browser into preallocated arrays.
+    Frames are read straight from the data nodes of the Signal_Signal sequence, so the browser does not move
+    and no proxy node update is triggered per item.
+    :param sequenceBrowserNode: vtkMRMLSequenceBrowserNode that recorded Signal_Signal
+    :returns: dict with "time", "channelA", "channelB" arrays of shape (n, samples) and "timestamps" of shape (n,)
+    """
     parameterNode = self.getParameterNode()
-    collectOffSeqBr = parameterNode.GetNodeReference(self.COLLECT_OFF_SEQUENCE_BROWSER)
-    signal_Signal = parameterNode.GetNodeReference(self.SIGNAL_SIGNAL)
-    n = collectOffSeqBr.GetNumberOfItems()
-    collectOffSeqBr.SelectFirstItem()
-    channelACollectOff = np.empty([n, 3900])
-    channelBCollectOff = np.empty([n, 3900])
-    featureCollectOff = np.empty([n, 6])
-    Y_CollectOff = np.full((n, 1), 0)
-    for i in range(n):
-      oscilloscopeArray = slicer.util.arrayFromVolume(signal_Signal)
-      ChA = oscilloscopeArray[0, 1]
-      ChB = oscilloscopeArray[0, 2]
-      channelACollectOff[i] = ChA
-      channelBCollectOff[i] = ChB
-      # TODO: take this outside the for loop
-      featureCollectOff[i][0] = self.lmrSum(ChA, ChB)
-      featureCollectOff[i][1] = self.maximum(ChB)
-      featureCollectOff[i][2] = self.fftPeakFreq(ChA)
-      featureCollectOff[i][3] = self.fftPeakAmp(ChA)
-      featureCollectOff[i][4] = self.absSum(ChA)
-      featureCollectOff[i][5] = self.absSum(ChB)
-      item = collectOffSeqBr.SelectNextItem()
-      signal_Signal = parameterNode.GetNodeReference(self.SIGNAL_SIGNAL)
-    np.save("D:/Research/Oscilloscope/featureCollectOff.npy", featureCollectOff)
-    np.save("D:/Research/Oscilloscope/channelACollectOff.npy", channelACollectOff)
-    np.save("D:/Research/Oscilloscope/channelBCollectOff.npy", channelBCollectOff)
-
-    collectCutAirSeqBr = parameterNode.GetNodeReference(self.COLLECT_CUT_AIR_SEQUENCE_BROWSER)
-    signal_Signal = parameterNode.GetNodeReference(self.SIGNAL_SIGNAL)
-    n = collectCutAirSeqBr.GetNumberOfItems()
-    collectCutAirSeqBr.SelectFirstItem()
-    channelACollectCutAir = np.empty([n, 3900])
-    channelBCollectCutAir = np.empty([n, 3900])
-    featureCollectCutAir = np.empty([n, 6])
-    Y_CollectCutAir = np.full((n, 1), 1)
-    for i in range(n):
-      oscilloscopeArray = slicer.util.arrayFromVolume(signal_Signal)
-      ChA = oscilloscopeArray[0, 1]
-      ChB = oscilloscopeArray[0, 2]
-      channelACollectCutAir[i] = ChA
-      channelBCollectCutAir[i] = ChB
-      featureCollectCutAir[i][0] = self.lmrSum(ChA, ChB)
-      featureCollectCutAir[i][1] = self.maximum(ChB)
-      featureCollectCutAir[i][2] = self.fftPeakFreq(ChA)
-      featureCollectCutAir[i][3] = self.fftPeakAmp(ChA)
-      featureCollectCutAir[i][4] = self.lmrSum(ChA, ChB)
-      featureCollectCutAir[i][5] = self.maximum(ChB)
-      collectCutAirSeqBr.SelectNextItem()
-      signal_Signal = parameterNode.GetNodeReference(self.SIGNAL_SIGNAL)
-    np.save("D:/Research/Oscilloscope/featureCollectCutAir.npy", featureCollectCutAir)
-    np.save("D:/Research/Oscilloscope/channelACollectCutAir.npy", channelACollectCutAir)
-    np.save("D:/Research/Oscilloscope/channelBCollectCutAir.npy", channelBCollectCutAir)
-
-    collectCutTissueSeqBr = parameterNode.GetNodeReference(self.COLLECT_CUT_TISSUE_SEQUENCE_BROWSER)
     signal_Signal = parameterNode.GetNodeReference(self.SIGNAL_SIGNAL)
-    n = collectCutTissueSeqBr.GetNumberOfItems()
-    collectCutTissueSeqBr.SelectFirstItem()
-    channelACollectCutTissue = np.empty([n, 3900])
-    channelBCollectCutTissue = np.empty([n, 3900])
-    featureCollectCutTissue = np.empty([n, 6])
-    Y_CollectCutTissue = np.full((n, 1), 2)
+    sequenceNode = sequenceBrowserNode.GetSequenceNode(signal_Signal)
+    n = sequenceNode.GetNumberOfDataNodes() if sequenceNode else 0
+    if n == 0:
+      emptyChannels = np.empty([0, self.featureExtractor.numberOfSamples])
+      return {"time": emptyChannels, "channelA": emptyChannels.copy(), "channelB": emptyChannels.copy(),
+              "timestamps": np.empty(0)}
+
+    firstArray = slicer.util.arrayFromVolume(sequenceNode.GetNthDataNode(0))
+    channels = np.empty((n,) + firstArray[0].shape, dtype=firstArray.dtype)
+    timestamps = np.empty(n)
     for i in range(n):
-      oscilloscopeArray = slicer.util.arrayFromVolume(signal_Signal)
-      ChA = oscilloscopeArray[0, 1]
-      ChB = oscilloscopeArray[0, 2]
-      channelACollectCutTissue[i] = ChA
-      channelBCollectCutTissue[i] = ChB
-      featureCollectCutTissue[i][0] = self.lmrSum(ChA, ChB)
-      featureCollectCutTissue[i][1] = self.maximum(ChB)
-      featureCollectCutTissue[i][2] = self.fftPeakFreq(ChA)
-      featureCollectCutTissue[i][3] = self.fftPeakAmp(ChA)
-      featureCollectCutTissue[i][4] = self.maximum(ChB)
-      featureCollectCutTissue[i][5] = self.maximum(ChB)
-      collectCutTissueSeqBr.SelectNextItem()
-      signal_Signal = parameterNode.GetNodeReference(self.SIGNAL_SIGNAL)
-
-    np.save("D:/Research/Oscilloscope/featureCollectCutTissue.npy", featureCollectCutTissue)
-    np.save("D:/Research/Oscilloscope/channelACollectCutTissue.npy", channelACollectCutTissue)
-    np.save("D:/Research/Oscilloscope/channelBCollectCutTissue.npy", channelBCollectCutTissue)
-
-    collectCoagAirSeqBr = parameterNode.GetNodeReference(self.COLLECT_COAG_AIR_SEQUENCE_BROWSER)
-    signal_Signal = parameterNode.GetNodeReference(self.SIGNAL_SIGNAL)
-    n = collectCoagAirSeqBr.GetNumberOfItems()
-    collectCoagAirSeqBr.SelectFirstItem()
-    channelACollectCoagAir = np.empty([n, 3900])
-    channelBCollectCoagAir = np.empty([n, 3900])
-    featureCollectCoagAir = np.empty([n, 6])
-    Y_CollectCoagAir = np.full((n, 1), 3)
-    for i in range(n):
-      oscilloscopeArray = slicer.util.arrayFromVolume(signal_Signal)
-      ChA = oscilloscopeArray[0, 1]
-      ChB = oscilloscopeArray[0, 2]
-      channelACollectCoagAir[i] = ChA
-      channelBCollectCoagAir[i] = ChB
-      featureCollectCoagAir[i][0] = self.lmrSum(ChA, ChB)
-      featureCollectCoagAir[i][1] = self.maximum(ChB)
-      featureCollectCoagAir[i][2] = self.fftPeakFreq(ChA)
-      featureCollectCoagAir[i][3] = self.fftPeakAmp(ChA)
-      featureCollectCoagAir[i][4] = self.lmrSum(ChA, ChB)
-      featureCollectCoagAir[i][5] = self.maximum(ChB)
-      collectCoagAirSeqBr.SelectNextItem()
-      signal_Signal = parameterNode.GetNodeReference(self.SIGNAL_SIGNAL)
-
-    np.save("D:/Research/Oscilloscope/featureCollectCoagAir.npy", featureCollectCoagAir)
-    np.save("D:/Research/Oscilloscope/channelACollectCoagAir.npy", channelACollectCoagAir)
-    np.save("D:/Research/Oscilloscope/channelBCollectCoagAir.npy", channelBCollectCoagAir)
-
-    collectCoagTissueSeqBr = parameterNode.GetNodeReference(self.COLLECT_COAG_TISSUE_SEQUENCE_BROWSER)
-    signal_Signal = parameterNode.GetNodeReference(self.SIGNAL_SIGNAL)
-    n = collectCoagTissueSeqBr.GetNumberOfItems()
-    collectCoagTissueSeqBr.SelectFirstItem()
-    channelACollectCoagTissue = np.empty([n, 3900])
-    channelBCollectCoagTissue = np.empty([n, 3900])
-    featureCollectCoagTissue = np.empty([n, 6])
-    Y_CollectCoagTissue = np.full((n, 1), 4)
-    for i in range(n):
-      oscilloscopeArray = slicer.util.arrayFromVolume(signal_Signal)
-      ChA = oscilloscopeArray[0, 1]
-      ChB = oscilloscopeArray[0, 2]
-      channelACollectCoagTissue[i] = ChA
-      channelBCollectCoagTissue[i] = ChB
-      featureCollectCoagTissue[i][0] = self.lmrSum(ChA, ChB)
-      featureCollectCoagTissue[i][1] = self.maximum(ChB)
-      featureCollectCoagTissue[i][2] = self.fftPeakFreq(ChA)
-      featureCollectCoagTissue[i][3] = self.fftPeakAmp(ChA)
-      featureCollectCoagTissue[i][4] = self.lmrSum(ChA, ChB)
-      featureCollectCoagTissue[i][5] = self.maximum(ChB)
-      collectCoagTissueSeqBr.SelectNextItem()
-      signal_Signal = parameterNode.GetNodeReference(self.SIGNAL_SIGNAL)
-    np.save("D:/Research/Oscilloscope/featureCollectCoagTissue.npy", featureCollectCoagTissue)
-    np.save("D:/Research/Oscilloscope/channelACollectCoagTissue.npy", channelACollectCoagTissue)
-    np.save("D:/Research/Oscilloscope/channelBCollectCoagTissue.npy", channelBCollectCoagTissue)
-
-    # append arrays, build X and Y\
-    features = np.append(featureCollectOff[:, 2:5], featureCollectCutAir[:, 2:5], axis=0)
-    features = np.append(features, featureCollectCutTissue[:, 2:5], axis=0)
-    features = np.append(features, featureCollectCoagAir[:, 2:5], axis=0)
-    features = np.append(features, featureCollectCoagTissue[:, 2:5], axis=0)
-    Y = np.append(Y_CollectOff, Y_CollectCutAir)
-    Y = np.append(Y, Y_CollectCutTissue)
-    Y = np.append(Y, Y_CollectCoagAir)
-    Y = np.append(Y, Y_CollectCoagTissue)
-
-    np.save("D:/Research/Oscilloscope/Y_collections.npy", Y)
-
-    print("collect off")
-    print(featureCollectOff)
-    print("coag air")
-    print(featureCollectCoagAir)
-    print("coag tissue")
-    print(featureCollectCoagTissue)
-    self.buildScopeModel(features, Y)
-
-  def buildScopeModel(self, features, Y):
+      channels[i] = slicer.util.arrayFromVolume(sequenceNode.GetNthDataNode(i))[0]
+      timestamps[i] = float(sequenceNode.GetNthIndexValue(i))
+    return {"time": channels[:, 0], "channelA": channels[:, 1], "channelB": channels[:, 2], "timestamps": timestamps}
+
+  def exportScopeDataset(self, fileName, scopeData, label, compressed=False):
+    """
+    Writes one class of scope recordings to a single .npz file with labels and timestamps.
+    Uncompressed files can be memory-mapped with loadScopeDataset, compressed files are smaller for archiving.
+    :param fileName: str, output .npz file
+    :param scopeData: dict returned by readScopeSequence
+    :param label: int, class label of all frames
+    :param compressed: bool, compress the arrays
+    """
+    labels = np.full(len(scopeData["timestamps"]), label)
+    save = np.savez_compressed if compressed else np.savez
+    save(fileName, labels=labels, **scopeData)
+    logging.info("Exported {} scope frames to {}".format(len(labels), fileName))
+
+  def setTrainAndImplementModel(self):
+    logging.info("setTrainAndImplementModel")
+    parameterNode = self.getParameterNode()
+    datasetDirectory = self.getDatasetDirectory()
+
+    # Reading sequence nodes touches the scene, so it stays on the main thread. It is fast with the bulk reader.
+    scopeDataByClass = {}
+    for className, browserReference, label in self.SCOPE_CLASSES:
+      sequenceBrowserNode = parameterNode.GetNodeReference(browserReference)
+      scopeData = self.readScopeSequence(sequenceBrowserNode)
+      self.exportScopeDataset(os.path.join(datasetDirectory, "Collect{}.npz".format(className)), scopeData, label)
+      scopeDataByClass[className] = (scopeData, label)
+
+    self.buildScopeModel(scopeDataByClass, os.path.join(datasetDirectory, self.MODEL_TRAINED_FILE))
+
+  def buildScopeModel(self, scopeDataByClass, modelFileName):
+    """
+    Extracts features and trains the cautery model in a background thread, so the UI stays responsive.
+    When training is finished, the best model is registered and used for classification.
+    :param scopeDataByClass: dict, class name to (scope data, label)
+    :param modelFileName: str, file the best model is saved to
+    """
     logging.info("buildScopeModel")
-    X_training, X_test, Y_train, Y_test = train_test_split(features, Y, test_size=0.2)
-
-    ##svc = svm.LinearSVC().fit(X_training, Y_train)
-    svc = svm.SVC(kernel = 'linear', decision_function_shape='ovo').fit(X_training, Y_train) #kernel = 'linear', C=1.0
-    # lin =
-    # rbf = svm.SVC(kernel = 'rbf', gamma = 0.9, C=1.0).fit(X_training, Y_train)
-    # poly = svm.SVC(kernel = 'poly', degree = 3, C = 1.0).fit(X_training, Y_train)
-
-    filename_svc = "D:\Research\Oscilloscope\cauteryModelSVM_svc.sav"
-    # filename_lin = "D:\Research\Oscilloscope\cauteryModelSVM_lin.sav"
-    # filename_rbf = "D:\Research\Oscilloscope\cauteryModelSVM_rbf.sav"
-    # filename_poly = "D:\Research\Oscilloscope\cauteryModelSVM_poly.sav"
-
-    pickle.dump(svc, open(filename_svc, "wb"))
-    # pickle.dump(lin, open(filename_lin, "wb"))
-    # pickle.dump(rbf, open(filename_rbf, "wb"))
-    # pickle.dump(poly, open(filename_poly, "wb"))
-
-    loaded_module_svc = pickle.load(open(filename_svc, "rb"))
-    # loaded_module_lin = pickle.load(open(filename_lin, "rb"))
-    # loaded_module_rbf = pickle.load(open(filename_rbf, "rb"))
-    # loaded_module_poly = pickle.load(open(filename_poly, "rb"))
-
-    result = loaded_module_svc.score(X_test, Y_test)
-    predict = loaded_module_svc.predict(X_test)
-    print("----SVC------")
-    print("Prediction", predict)
-    print("Y test", Y_test)
-    print("result", result)
-
-    # print("-----LIN------")
-    # result = loaded_module_lin.score(X_test, Y_test)
-    # predict = loaded_module_lin.predict(X_test)
-    # print("Prediction", predict)
-    # print("Y test", Y_test)
-    # print("result", result)
-    # print("-----RBF------")
-    # result = loaded_module_rbf.score(X_test, Y_test)
-    # predict = loaded_module_rbf.predict(X_test)
-    # print("Prediction", predict)
-    # print("Y test", Y_test)
-    # print("result", result)
-    # np.save("D:/Research/Oscilloscope/features.npy", features)
-    # np.save("D:/Research/Oscilloscope/Y.npy", Y)
-    # print("-----POLY------")
-    # result_poly = loaded_module_poly.score(X_test, Y_test)
-    # predict_poly = loaded_module_poly.predict(X_test)
-    # print("Prediction", predict_poly)
-    # print("Y test", Y_test)
-    # print("result", result_poly)
-
-    # h = 0.02  # step size in the mesh
-    #
-    # # create a mesh to plot in
-    #
-    # X_train_min, X_train_max = X_training[:,0].min() - 1, X_training[:,0].max() + 1
-    # Y_train_min, Y_train_max = X_training[:,1].min() - 1, X_training[:,1].max() + 1
-    # X_train, yy = np.meshgrid(np.float32(np.arange(X_train_min, X_train_max, h)), np.float32(np.arange(Y_train_min, Y_train_max, h)))
-    # # title for the plots
-    # titles = ['SVC with linear kernel',
-    #     'LinearSVC (linear kernel)',
-    #       'SVC with RBF kernel',
-    #       'SVC with polynomial (degree 3) kernel']
-    #
-    # for i, clf in enumerate((svc, lin_svc, rbf_svc, poly_svc)):
-    #   # Plot the decision boundarY_train. For that, we will assign a color to each
-    #   # point in the mesh [X_train_min, X_train_max]X_train[Y_train_min, Y_train_max].
-
-    #
-    #   plt.subplot(2, 2, i + 1)
-    #   plt.subplots_adjust(wspace=0.4, hspace=0.4)
-    #
-    #   Z = clf.predict(np.c_[X_train.ravel(), yy.ravel()])
-    #
-    #   # Put the result into a color plot
-    #   Z = Z.reshape(X_train.shape)
-    #   plt.contourf(X_train, yy, Z, cmap=plt.cm.coolwarm, alpha=0.8)
-    #
-    #   # Plot also the training points
-    #   plt.scatter(X_training[:,0], X_training[:,1], c = Y_train, cmap=plt.cm.coolwarm)
-    #   plt.xlabel('lmr')
-    #   plt.ylabel('mMean')
-    #   plt.xlim(X_train.min(), X_train.max())
-    #   plt.ylim(yy.min(), yy.max())
-    #   plt.xticks(())
-    #   plt.yticks(())
-    #   plt.title(titles[i])
-    #   plot_decision_regions(X_training, Y_train, clf = clf, legend=2)
-    #   d = {"Off": 0, "CutAir": 1, "CutTissue": 2, "CoagAir": 3, "CoagTissue": 4}
-    #   handles, labels =  plt.gca().get_legend_handles_labels()
-    #   d_rev = {y:x for x,y in d.items()}
-    #   plt.legend(handles, list(map(d_rev.get, [int(i) for i in d_rev])))
-
-    # plt.savefig('/Users/Josh Ehrlich/Desktop/SVM.png')
-
-    # #save arrays as volume
-    # scopeOffVolumeA = parameterNode.GetNodeReference(self.SCOPE_OFF_VOLUME_A)
-    # vtkGrayscale = numpy_support.numpy_to_vtk(channelACollectOff.flatten(order='C'), deep=True, array_type=vtk.VTK_DOUBLE)
-    # # Convert the image to vtkImageData object
-    # sliceImageData = vtk.vtkImageData()
-    # sliceImageData.SetDimensions(len(channelACollectOff[0]), len(channelACollectOff), 1)
-    # sliceImageData.SetOrigin(0.0, 0.0, 0.0)
-    # sliceImageData.GetPointData().SetScalars(vtkGrayscale)
-    # scopeOffVolumeA.SetAndObserveImageData(sliceImageData)
-
-    # scopeOffVolumeB = parameterNode.GetNodeReference(self.SCOPE_OFF_VOLUME_B)
-    # vtkGrayscale = numpy_support.numpy_to_vtk(channelACollectOff.flatten(order='C'), deep=True, array_type=vtk.VTK_DOUBLE)
-    # # Convert the image to vtkImageData object
-    # sliceImageData = vtk.vtkImageData()
-    # sliceImageData.SetDimensions(len(channelACollectOff[0]), len(channelACollectOff), 1)
-    # sliceImageData.SetOrigin(0.0, 0.0, 0.0)
-    # sliceImageData.GetPointData().SetScalars(vtkGrayscale)
-    # scopeOffVolumeB.SetAndObserveImageData(sliceImageData)
-
-    # self.buildScopeModel()
-
-  # def buildScopeModel(self):
-  #   parameterNode = self.getParameterNode()
-  #   scopeOffVolumeA = parameterNode.GetNodeReference(self.SCOPE_OFF_VOLUME_A)
-  #   scopeOffArrayA = slicer.util.arrayFromVolume(scopeOffVolumeA)
-  #   scopeCutAirVolumeA = parameterNode.GetNodeReference(self.SCOPE_CUT_AIR_VOLUME_A)
-  #   scopeCutAirArrayA = slicer.util.arrayFromVolume(scopeCutAirVolumeA)
-  #   scopeCutTissueVolumeA = parameterNode.GetNodeReference(self.SCOPE_CUT_TISSUE_VOLUME_A)
-  #   scopeCutTissueArrayA = slicer.util.arrayFromVolume(scopeCutTissueVolumeA)
-  #   scopeCoagAirVolumeA = parameterNode.GetNodeReference(self.SCOPE_COAG_AIR_VOLUME_A)
-  #   scopeCoagAirArrayA = slicer.util.arrayFromVolume(scopeCoagAirVolumeA)
-  #   scopeCoagTissueVolumeA = parameterNode.GetNodeReference(self.SCOPE_COAG_TISSUE_VOLUME_A)
-  #   scopeCoagTissueArrayA = slicer.util.arrayFromVolume(scopeCoagTissueVolumeA)
-
-  #   scopeOffVolumeB = parameterNode.GetNodeReference(self.SCOPE_OFF_VOLUME_B)
-  #   scopeOffArrayB = slicer.util.arrayFromVolume(scopeOffVolumeB)
-  #   scopeCutAirVolumeB = parameterNode.GetNodeReference(self.SCOPE_CUT_AIR_VOLUME_B)
-  #   scopeCutAirArrayB = slicer.util.arrayFromVolume(scopeCutAirVolumeB)
-  #   scopeCutTissueVolumeB = parameterNode.GetNodeReference(self.SCOPE_CUT_TISSUE_VOLUME_B)
-  #   scopeCutTissueArrayB = slicer.util.arrayFromVolume(scopeCutTissueVolumeB)
-  #   scopeCoagAirVolumeB = parameterNode.GetNodeReference(self.SCOPE_COAG_AIR_VOLUME_B)
-  #   scopeCoagAirArrayB = slicer.util.arrayFromVolume(scopeCoagAirVolumeB)
-  #   scopeCoagTissueVolumeB = parameterNode.GetNodeReference(self.SCOPE_COAG_TISSUE_VOLUME_B)
-  #   scopeCoagTissueArrayB = slicer.util.arrayFromVolume(scopeCoagTissueVolumeB)
+    if self.trainingThread is not None and self.trainingThread.is_alive():
+      logging.warning("Cautery model training is already running")
+      return
+
+    trainer = CauteryModelTrainer(self.featureExtractor, self.TRAINING_FEATURES)
+    self.trainingResult = None
+    self.trainingModelFileName = modelFileName
+
+    def train():
+      try:
+        features, labels = trainer.extractFeatures(scopeDataByClass)
+        result = trainer.train(features, labels)
+        trainer.save(modelFileName, result, {label: className for className, (_, label) in scopeDataByClass.items()})
+        self.trainingResult = result
+      except Exception as e:
+        logging.error("Cautery model training failed: {}".format(e))
+        self.trainingResult = e
+
+    self.trainingThread = threading.Thread(target=train, name="CauteryModelTraining", daemon=True)
+    self.trainingThread.start()
+
+    if self.trainingTimer is None:
+      self.trainingTimer = qt.QTimer()
+      self.trainingTimer.setInterval(200)
+      self.trainingTimer.connect('timeout()', self.onTrainingTimer)
+    self.trainingTimer.start()
+
+  def onTrainingTimer(self):
+    """
+    Checks on the main thread whether background training finished, and registers the new model if it did.
+    """
+    if self.trainingThread is not None and self.trainingThread.is_alive():
+      return
+    self.trainingTimer.stop()
+    result = self.trainingResult
+    if result is None or isinstance(result, Exception):
+      return
+    for modelName, modelResult in result["models"].items():
+      logging.info("{}: accuracy {:.3f} +/- {:.3f}, parameters {}".format(
+        modelName, modelResult["meanAccuracy"], modelResult["stdAccuracy"], modelResult["bestParameters"]))
+    logging.info("Best cautery model: {}".format(result["bestModelName"]))
+    self.modelRegistry.registerModel(self.MODEL_TRAINED, self.trainingModelFileName, self.TRAINING_FEATURES)
+    self.setActiveModels([self.MODEL_TRAINED])
 
   def setUseModelClicked(self, clicked):
+    """
+    Starts or stops streaming classification of the cautery state.
+    Scope updates are only buffered, and the state is classified and written to the CauteryState text node
+    and parameter at CAUTERY_STATE_UPDATE_RATE_HZ.
+    """
     parameterNode = self.getParameterNode()
     signal_Signal = parameterNode.GetNodeReference(self.SIGNAL_SIGNAL)
+    if self.cauteryStateTimer is None:
+      self.cauteryStateTimer = qt.QTimer()
+      self.cauteryStateTimer.setInterval(int(1000 / self.CAUTERY_STATE_UPDATE_RATE_HZ))
+      self.cauteryStateTimer.connect('timeout()', self.updateCauteryState)
     if clicked:
+      self.getCauteryStateTextNode()
+      self.cauteryStateClassifier.resetCounters()
       self.addObserver(signal_Signal, slicer.vtkMRMLScalarVolumeNode.ImageDataModifiedEvent, self.useModelModified)
+      self.cauteryStateTimer.start()
     else:
       self.removeObserver(signal_Signal, slicer.vtkMRMLScalarVolumeNode.ImageDataModifiedEvent,
                           self.useModelModified)
+      self.cauteryStateTimer.stop()
+      statistics = self.cauteryStateClassifier.getStatistics()
+      logging.info("Cautery state classification: {framesClassified} of {framesReceived} frames classified, "
+                   "{classifiedFramesPerSecond:.1f} frames/s, mean latency {meanLatencySeconds:.3f} s".format(**statistics))
+
+  def getCauteryStateTextNode(self):
+    """
+    Returns the text node that holds the current cautery state, creating it if needed.
+    """
+    parameterNode = self.getParameterNode()
+    stateTextNode = parameterNode.GetNodeReference(self.CAUTERY_STATE_TEXT_NODE)
+    if stateTextNode is None:
+      stateTextNode = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLTextNode", self.CAUTERY_STATE_TEXT_NODE)
+      stateTextNode.SaveWithSceneOff()
+      parameterNode.SetNodeReferenceID(self.CAUTERY_STATE_TEXT_NODE, stateTextNode.GetID())
+    return stateTextNode
+
+  def updateCauteryState(self):
+    """
+    Classifies buffered scope frames and publishes the state only when it changed.
+    """
+    if not self.cauteryStateClassifier.update():
+      return
+    state = self.cauteryStateClassifier.state
+    self.getCauteryStateTextNode().SetText(state)
+    self.getParameterNode().SetParameter(self.CAUTERY_STATE_PARAMETER, state)
+
+  def setActiveModels(self, modelNames):
+    """
+    Selects which cautery models are run on oscilloscope updates. Streaming cautery state classification only runs
+    the state model, which is kept if it is among modelNames and is the first of modelNames otherwise.
+    :param modelNames: list of str, e.g. [MODEL_SVM, MODEL_RF]
+    """
+    self.modelRegistry.setActiveModels(modelNames)
+    if modelNames and self.cauteryStateClassifier.stateModelName not in modelNames:
+      self.setCauteryStateModel(modelNames[0])
+
+  def setCauteryStateModel(self, modelName):
+    """
+    Selects the model whose labels drive the cautery state. It is the only model run by streaming classification.
+    :param modelName: str, registered model name, e.g. MODEL_SVM
+    """
+    if modelName not in self.modelRegistry.modelFiles:
+      raise ValueError("Unknown cautery model: {}".format(modelName))
+    self.cauteryStateClassifier.stateModelName = modelName
+    self.getParameterNode().SetParameter(self.CAUTERY_STATE_MODEL_PARAMETER, modelName)
+    logging.info("Cautery state is classified with model {}".format(modelName))
 
   def useModelModified(self, observer, eventID):
-    #TODO: is there a better way to load and run the model?
-    scriptPath = os.path.dirname(os.path.abspath(__file__))
-    modelsPath = str(scriptPath) + "\Models"
-    fileName_SVM = modelsPath + "\April1_apple_40W_20000_SVM.sav"
-    fileName_RF = modelsPath + "\April1_apple_40W_20000_RF.sav"
-    svm = pickle.load(open(fileName_SVM, "rb"))
-    rf = pickle.load(open(fileName_RF, "rb"))
     parameterNode = self.getParameterNode()
     oscilloscopeVolume = parameterNode.GetNodeReference(self.SIGNAL_SIGNAL)
     oscilloscopeArray = slicer.util.arrayFromVolume(oscilloscopeVolume)
-    oscilloscopeArray = slicer.util.arrayFromVolume(oscilloscopeVolume)
-    ChA = oscilloscopeArray[0, 1]
-    fs = 4e3
-    x = ChA
-    maxVoltage = np.max(x)
-    X = detrend(x)
-    X = resample(X, int(fs * 0.1))
-    t = np.linspace(0, 0.1, int(fs * 0.1))
-    F = rfftfreq(len(X), 1 / fs)
-    X = np.abs(rfft(X))
-    maxFreq = np.max(X)
-    index = np.where(X == maxFreq)
-    amplitude = F[index][0]
-    sumX = np.sum(X)
-    features = np.empty([1, 3])
-    features[0][0] = maxVoltage
-    features[0][1] = maxFreq
-    features[0][2] = amplitude
-    print(maxVoltage, maxFreq, amplitude)
-    predict_svm = svm.predict(features)
-    predict_rf = rf.predict(features)
-    print("Prediction", predict_svm)
-    print("Prediction", predict_rf)
+    self.cauteryStateClassifier.addFrame(oscilloscopeArray[0, 1], oscilloscopeArray[0, 2])
 
   def mean(self, channel):
     mean = np.mean(channel)
@@ -1146,43 +1554,16 @@ class CauteryClassificationLogic(ScriptedLoadableModuleLogic, VTKObservationMixi
     return mMean
 
   def fftFreqAmpSingle(self, channelA):
-    fs = 4e3
-    x = channelA
-    x = detrend(x)
-    x = resample(x, int(fs * 0.1))
-    t = np.linspace(0, 0.1, int(fs * 0.1))
-    F = rfftfreq(len(x), 1 / fs)
-    X = np.abs(rfft(x))
-    maxFreq = np.max(X)
-    index = np.where(X == maxFreq)
-    amplitude = F[index][0]
-    return [maxFreq,amplitude]
+    peaks, frequencies = self.featureExtractor.fftPeak(channelA)
+    return [peaks[0], frequencies[0]]
 
   def fftPeakFreq(self, channelA):
-    fs = 4e3
-    x = channelA
-    x = detrend(x)
-    x = resample(x, int(fs * 0.1))
-    t = np.linspace(0, 0.1, int(fs * 0.1))
-    F = rfftfreq(len(x), 1 / fs)
-    X = np.abs(rfft(x))
-    maxFreq = np.max(X)
-    index = np.where(X == maxFreq)
-    amplitude = F[index][0]
-    return maxFreq
+    peaks, frequencies = self.featureExtractor.fftPeak(channelA)
+    return peaks[0]
 
   def fftPeakAmp(self, channelA):
-    fs = 4e3
-    x = channelA
-    x = detrend(x)
-    x = resample(x, int(fs * 0.1))
-    t = np.linspace(0, 0.1, int(fs * 0.1))
-    F = rfftfreq(len(x), 1 / fs)
-    X = np.abs(rfft(x))
-    maxFreq = np.max(X)
-    index = np.where(X == maxFreq)
-    amplitude = F[index][0]
-    return amplitude
+    peaks, frequencies = self.featureExtractor.fftPeak(channelA)
+    return frequencies[0]
 
   def process(self, inputVolume, outputVolume, imageThreshold, invert=False, showResult=True):
     """
@@ -7,6 +7,7 @@ import logging
 import time
 import math
 import numpy
+from vtk.util import numpy_support
 
 
 #
@@ -192,6 +193,8 @@ class LumpNavGuidelet(Guidelet):
     # Set needle and cautery transforms and models
     self.tumorMarkups_Needle = None
     self.tumorMarkups_NeedleObserver = None
+    # NumPy mirror of the tumor points, refreshed whenever the tumor model is rebuilt
+    self.tumorPoints = numpy.zeros((0, 3))
 
     # Second fiducial node used to erase points
     self.eraseMarkups_Needle = slicer.vtkMRMLMarkupsFiducialNode()
@@ -1054,8 +1057,6 @@ class LumpNavGuidelet(Guidelet):
     logging.debug('createTumorFromMarkups')
     #self.tumorMarkups_Needle.SetDisplayVisibility(0)
     # Create polydata point set from markup points
-    points = vtk.vtkPoints()
-    cellArray = vtk.vtkCellArray()
     numberOfPoints = self.tumorMarkups_Needle.GetNumberOfFiducials()
 
     if numberOfPoints>0:
@@ -1069,11 +1070,8 @@ class LumpNavGuidelet(Guidelet):
     if numberOfPoints<1:
       return
     
-    points.SetNumberOfPoints(numberOfPoints)
+    self.tumorPoints = self.getFiducialPositions(self.tumorMarkups_Needle)
     new_coord = [0.0, 0.0, 0.0]
-    for i in range(numberOfPoints):
-      self.tumorMarkups_Needle.GetNthFiducialPosition(i,new_coord)
-      points.SetPoint(i, new_coord)
 
     if self.placeButton.isChecked() :
       if self.loggingFlag == False : 
@@ -1083,9 +1081,12 @@ class LumpNavGuidelet(Guidelet):
         self.tumorMarkups_Needle.GetNthFiducialPosition(numberOfPoints-1,new_coord)
         logging.info("Placed point at position: %s", new_coord)
     
-    cellArray.InsertNextCell(numberOfPoints)
-    for i in range(numberOfPoints):
-      cellArray.InsertCellPoint(i)
+    # Points and the polyline through them are passed to VTK as whole arrays
+    points = vtk.vtkPoints()
+    points.SetData(numpy_support.numpy_to_vtk(self.tumorPoints, deep=True))
+    cellArray = vtk.vtkCellArray()
+    cellIds = numpy.concatenate(([numberOfPoints], numpy.arange(numberOfPoints))).astype(numpy_support.get_numpy_array_type(vtk.VTK_ID_TYPE))
+    cellArray.SetCells(1, numpy_support.numpy_to_vtkIdTypeArray(cellIds, deep=True))
 
     pointPolyData = vtk.vtkPolyData()
     pointPolyData.SetLines(cellArray)
@@ -1161,21 +1162,25 @@ class LumpNavGuidelet(Guidelet):
 
   # returns closest marked point to where eraser fiducial was placed
   def returnClosestPoint(self, fiducialNode, erasePoint) :
-    closestIndex = 0
-    numberOfPoints = fiducialNode.GetNumberOfFiducials()
-    closestPosition = [0.0,0.0,0.0]
-    fiducialNode.GetNthFiducialPosition(0, closestPosition)
-    distanceToClosest = self.returnDistance(closestPosition, erasePoint)
-    fiducialPosition = [0.0,0.0,0.0]
-    for fiducialIndex in range(1, numberOfPoints) :
-      fiducialNode.GetNthFiducialPosition(fiducialIndex, fiducialPosition)
-      distanceToPoint = self.returnDistance(fiducialPosition, erasePoint)
-      if distanceToPoint < distanceToClosest :
-        closestIndex = fiducialIndex
-        distanceToClosest = distanceToPoint
-    fiducialNode.GetNthFiducialPosition(closestIndex, fiducialPosition)
-    logging.info("Used eraser to remove point at %s", fiducialPosition)
+    fiducialPositions = self.tumorPoints
+    if fiducialNode is not self.tumorMarkups_Needle or len(fiducialPositions) != fiducialNode.GetNumberOfFiducials() :
+      fiducialPositions = self.getFiducialPositions(fiducialNode)
+    squaredDistances = numpy.sum((fiducialPositions - numpy.asarray(erasePoint)) ** 2, axis=1)
+    closestIndex = int(numpy.argmin(squaredDistances))
+    logging.info("Used eraser to remove point at %s", fiducialPositions[closestIndex])
     return closestIndex
+
+  def getFiducialPositions(self, fiducialNode) :
+    numberOfFiducials = fiducialNode.GetNumberOfFiducials()
+    # Slicer 4.11 and later keep all control points in a polydata that can be read in one step
+    if hasattr(fiducialNode, "GetCurveInputPoly") and numberOfFiducials > 0 :
+      controlPoints = fiducialNode.GetCurveInputPoly().GetPoints()
+      if controlPoints is not None and controlPoints.GetNumberOfPoints() == numberOfFiducials :
+        return numpy.array(numpy_support.vtk_to_numpy(controlPoints.GetData()), dtype=float)
+    fiducialPositions = numpy.zeros((numberOfFiducials, 3))
+    for fiducialIndex in range(numberOfFiducials) :
+      fiducialNode.GetNthFiducialPosition(fiducialIndex, fiducialPositions[fiducialIndex])
+    return fiducialPositions
   
   def returnDistance(self, point1, point2) :
     import numpy as np
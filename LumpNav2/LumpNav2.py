@@ -2,10 +2,13 @@ import os
 import datetime
 import time
 import json
+import queue
+import threading
 from packaging import version
 
 import numpy as np
 import vtk, qt, ctk, slicer
+from vtk.util import numpy_support
 
 import logging
 from slicer.ScriptedLoadableModule import *
@@ -31,6 +34,12 @@ except:
   slicer.util.pip_install('mlxtend')
   from mlxtend.plotting import plot_decision_regions
 
+try:
+  from scipy.spatial import ConvexHull, cKDTree
+except:
+  slicer.util.pip_install('scipy')
+  from scipy.spatial import ConvexHull, cKDTree
+
 #
 # LumpNav2
 #
@@ -745,8 +754,7 @@ class LumpNav2Widget(ScriptedLoadableModuleWidget, VTKObservationMixin):
 
   def onBreachMarkupsProximityChanged(self, value):
     logging.info(f"onBreachMarkupsProximityChanged({value})")
-    settings = qt.QSettings()
-    settings.setValue(self.logic.BREACH_MARKUPS_PROXIMITY_THRESHOLD, value)
+    self.logic.setBreachMarkupsProximityThreshold(value)
 
   def onFreezeUltrasoundClicked(self, toggled):
     logging.info(f"onFreezeUltrasoundClicked({toggled})")
@@ -1506,6 +1514,666 @@ class LumpNav2Widget(ScriptedLoadableModuleWidget, VTKObservationMixin):
     self._parameterNode.EndModify(wasModified)
 
 
+#
+# Markups NumPy bridge
+#
+
+def arrayFromMarkupsNode(markupsNode, copy=True):
+  """
+  Returns the control point positions of a markups node as an (n, 3) array, in the coordinate system of the node.
+  Positions are read in one step from the control point polydata that the node maintains, and point by point only
+  if that polydata is not in sync. With copy=False the array may be a view into the polydata, which is only valid
+  until the control points change.
+  """
+  numberOfPoints = markupsNode.GetNumberOfControlPoints()
+  controlPointsPolyData = markupsNode.GetCurveInputPoly()
+  controlPoints = controlPointsPolyData.GetPoints() if controlPointsPolyData is not None else None
+  if numberOfPoints > 0 and controlPoints is not None and controlPoints.GetNumberOfPoints() == numberOfPoints:
+    points = numpy_support.vtk_to_numpy(controlPoints.GetData())
+    return np.array(points, dtype=float) if copy else points
+  points = np.zeros((numberOfPoints, 3))
+  for i in range(numberOfPoints):
+    markupsNode.GetNthControlPointPosition(i, points[i])
+  return points
+
+
+def polyDataFromPoints(points, polyLine=False, triangles=None):
+  """
+  Builds polydata from an (n, 3) array of points in one step instead of inserting points one by one.
+  :param polyLine: bool, also add one polyline cell through all points in order
+  :param triangles: (m, 3) array of point indices, added as triangle cells if given
+  """
+  points = np.ascontiguousarray(points, dtype=float).reshape(-1, 3)
+  vtkPoints = vtk.vtkPoints()
+  vtkPoints.SetData(numpy_support.numpy_to_vtk(points, deep=True))
+  polyData = vtk.vtkPolyData()
+  polyData.SetPoints(vtkPoints)
+  if polyLine and len(points) > 0:
+    idType = numpy_support.get_numpy_array_type(vtk.VTK_ID_TYPE)
+    offsets = np.array([0, len(points)], dtype=idType)
+    connectivity = np.arange(len(points), dtype=idType)
+    lines = vtk.vtkCellArray()
+    lines.SetData(numpy_support.numpy_to_vtkIdTypeArray(offsets, deep=True),
+                  numpy_support.numpy_to_vtkIdTypeArray(connectivity, deep=True))
+    polyData.SetLines(lines)
+  if triangles is not None:
+    idType = numpy_support.get_numpy_array_type(vtk.VTK_ID_TYPE)
+    offsets = np.arange(0, 3 * len(triangles) + 1, 3, dtype=idType)
+    connectivity = np.ascontiguousarray(triangles, dtype=idType).ravel()
+    polys = vtk.vtkCellArray()
+    polys.SetData(numpy_support.numpy_to_vtkIdTypeArray(offsets, deep=True),
+                  numpy_support.numpy_to_vtkIdTypeArray(connectivity, deep=True))
+    polyData.SetPolys(polys)
+  return polyData
+
+
+#
+# Convex hull
+#
+
+def decimatePointsToVoxels(points, voxelSize):
+  """
+  Keeps one point per cell of a grid with the given spacing, the one furthest from the centroid of all points.
+  The convex hull of the result is within one cell diagonal of the convex hull of all points.
+  """
+  voxelCoordinates = np.floor(points / voxelSize).astype(np.int64)
+  voxelCoordinates -= voxelCoordinates.min(axis=0)
+  voxelIndices = np.ravel_multi_index(voxelCoordinates.T, voxelCoordinates.max(axis=0) + 1)
+  squaredDistances = np.sum((points - points.mean(axis=0)) ** 2, axis=1)
+  order = np.lexsort((-squaredDistances, voxelIndices))
+  sortedVoxelIndices = voxelIndices[order]
+  isFirstInVoxel = np.ones(len(order), dtype=bool)
+  isFirstInVoxel[1:] = sortedVoxelIndices[1:] != sortedVoxelIndices[:-1]
+  return points[order[isFirstInVoxel]]
+
+
+def computeConvexHull(points):
+  """
+  Computes the convex hull of an (n, 3) point array with Qhull.
+  :returns: tuple of hull vertex indices into points, (m, 3) triangles indexing the hull vertices with outward
+    winding, and (m, 4) outward facet planes (normal, offset) with normal . x + offset <= 0 inside the hull
+  """
+  hull = ConvexHull(points)
+  vertexIndices = hull.vertices
+  vertexIdsByPoint = np.full(len(points), -1, dtype=int)
+  vertexIdsByPoint[vertexIndices] = np.arange(len(vertexIndices))
+  triangles = vertexIdsByPoint[hull.simplices]
+  a, b, c = points[hull.simplices[:, 0]], points[hull.simplices[:, 1]], points[hull.simplices[:, 2]]
+  isInward = np.einsum("ij,ij->i", np.cross(b - a, c - a), hull.equations[:, :3]) < 0
+  triangles[isInward] = triangles[isInward][:, ::-1]
+  return vertexIndices, triangles, hull.equations
+
+
+def convexHullPolyData(points, voxelSize=0.0):
+  """
+  Returns the convex hull of an (n, 3) point array as a closed triangle mesh.
+  :param voxelSize: float, if positive, points are first reduced to one per voxel of this size
+  """
+  points = np.asarray(points, dtype=float).reshape(-1, 3)
+  if voxelSize > 0 and len(points) > 0:
+    points = decimatePointsToVoxels(points, voxelSize)
+  if len(points) < 4:
+    return polyDataFromPoints(points)
+  try:
+    vertexIndices, triangles, _ = computeConvexHull(points)
+  except Exception as e:
+    # Qhull fails on flat or degenerate point sets
+    logging.warning(f"Convex hull could not be computed: {e}")
+    return polyDataFromPoints(points)
+  return polyDataFromPoints(points[vertexIndices], triangles=triangles)
+
+
+#
+# TumorHullBuilder
+#
+
+class TumorHullBuilder:
+  """
+  Keeps the convex hull of the contoured tumor points up to date as points are added and removed.
+  Every contour point stands for a unit cube, like the cube glyphs of the original pipeline, so the hull never
+  collapses to a plane. Points added inside the hull, and removed points that do not touch the hull, leave the
+  surface unchanged. A point added outside the hull only re-hulls the current hull points plus the new one.
+  Any other change falls back to a full rebuild. Smoothing is a final stage applied to the small hull mesh.
+  """
+
+  CUBE_CORNERS = 0.5 * np.array([[x, y, z] for x in (-1, 1) for y in (-1, 1) for z in (-1, 1)], dtype=float)
+  INSIDE_TOLERANCE = 1e-6
+
+  def __init__(self, numberOfSubdivisions=3, featureAngle=100.0):
+    self.numberOfSubdivisions = numberOfSubdivisions
+    self.featureAngle = featureAngle
+    self.numberOfFullRebuilds = 0
+    self.numberOfIncrementalUpdates = 0
+    self.numberOfSkippedUpdates = 0
+    self.reset()
+
+  def reset(self):
+    self.points = np.zeros((0, 3))
+    self.hullPointIndices = np.zeros(0, dtype=int)
+    self.hullVertexPointIndices = np.zeros(0, dtype=int)
+    self.hullPolyData = None
+    self.surfacePolyData = None
+    self.planeNormals = None
+    self.planeOffsets = None
+
+  def update(self, points):
+    """
+    Brings the hull up to date with the current contour points.
+    :param points: (n, 3) array of contour point positions
+    :returns: bool, True if the surface changed
+    """
+    points = np.array(points, dtype=float).reshape(-1, 3)
+    previousPoints = self.points
+    numberOfPreviousPoints = len(previousPoints)
+    if len(points) == 0:
+      self.reset()
+      return numberOfPreviousPoints > 0
+
+    self.points = points
+    if self.hullPolyData is None:
+      return self.rebuild()
+
+    if len(points) == numberOfPreviousPoints + 1 and np.array_equal(points[:-1], previousPoints):
+      if self.containsPoint(points[-1]):
+        self.numberOfSkippedUpdates += 1
+        return False
+      self.numberOfIncrementalUpdates += 1
+      hullVertices = numpy_support.vtk_to_numpy(self.hullPolyData.GetPoints().GetData())
+      self.computeHull(
+        np.vstack((hullVertices, points[-1] + self.CUBE_CORNERS)),
+        np.append(self.hullVertexPointIndices, [numberOfPreviousPoints] * len(self.CUBE_CORNERS)))
+      return True
+
+    if len(points) == numberOfPreviousPoints - 1:
+      removedIndex = self.findRemovedIndex(previousPoints, points)
+      if removedIndex is not None and removedIndex not in self.hullPointIndices:
+        self.hullPointIndices[self.hullPointIndices > removedIndex] -= 1
+        self.hullVertexPointIndices[self.hullVertexPointIndices > removedIndex] -= 1
+        self.numberOfSkippedUpdates += 1
+        return False
+    elif len(points) == numberOfPreviousPoints and np.array_equal(points, previousPoints):
+      return False
+
+    return self.rebuild()
+
+  def rebuild(self):
+    self.numberOfFullRebuilds += 1
+    corners = (self.points[:, np.newaxis, :] + self.CUBE_CORNERS).reshape(-1, 3)
+    self.computeHull(corners, np.repeat(np.arange(len(self.points)), len(self.CUBE_CORNERS)))
+    return True
+
+  @staticmethod
+  def findRemovedIndex(previousPoints, points):
+    """
+    Returns the index of the single row removed from previousPoints to give points, or None if points is not
+    previousPoints with one row removed.
+    """
+    differs = np.any(previousPoints[:-1] != points, axis=1)
+    removedIndex = int(np.argmax(differs)) if differs.any() else len(points)
+    if np.array_equal(previousPoints[removedIndex + 1:], points[removedIndex:]):
+      return removedIndex
+    return None
+
+  def containsPoint(self, point):
+    corners = point + self.CUBE_CORNERS
+    distances = corners @ self.planeNormals.T - self.planeOffsets
+    return bool(np.all(distances <= self.INSIDE_TOLERANCE))
+
+  def computeHull(self, candidatePoints, candidatePointIndices):
+    """
+    Computes the convex hull of the candidate points and smooths it into surfacePolyData.
+    :param candidatePoints: (m, 3) array, cube corners or previous hull vertices
+    :param candidatePointIndices: (m,) array, contour point index that each candidate point belongs to
+    """
+    vertexIndices, triangles, planes = computeConvexHull(candidatePoints)
+    self.hullVertexPointIndices = candidatePointIndices[vertexIndices]
+    self.hullPointIndices = np.unique(self.hullVertexPointIndices)
+    self.hullPolyData = polyDataFromPoints(candidatePoints[vertexIndices], triangles=triangles)
+    self.planeNormals = planes[:, :3]
+    self.planeOffsets = -planes[:, 3]
+
+    smoother = vtk.vtkButterflySubdivisionFilter()
+    smoother.SetInputData(self.hullPolyData)
+    smoother.SetNumberOfSubdivisions(self.numberOfSubdivisions)
+    normals = vtk.vtkPolyDataNormals()
+    normals.SetInputConnection(smoother.GetOutputPort())
+    normals.SetFeatureAngle(self.featureAngle)
+    normals.Update()
+    self.surfacePolyData = normals.GetOutput()
+
+  @staticmethod
+  def buildReferenceSurface(points, numberOfSubdivisions=3):
+    """
+    Original full rebuild pipeline, kept as the reference for benchmarkTumorReconstruction.
+    """
+    numberOfPoints = len(points)
+    vtkPoints = vtk.vtkPoints()
+    vtkPoints.SetNumberOfPoints(numberOfPoints)
+    for i in range(numberOfPoints):
+      vtkPoints.SetPoint(i, points[i])
+    cellArray = vtk.vtkCellArray()
+    cellArray.InsertNextCell(numberOfPoints)
+    for i in range(numberOfPoints):
+      cellArray.InsertCellPoint(i)
+    pointPolyData = vtk.vtkPolyData()
+    pointPolyData.SetLines(cellArray)
+    pointPolyData.SetPoints(vtkPoints)
+
+    cube = vtk.vtkCubeSource()
+    glyph = vtk.vtkGlyph3D()
+    glyph.SetInputData(pointPolyData)
+    glyph.SetSourceConnection(cube.GetOutputPort())
+    delaunay = vtk.vtkDelaunay3D()
+    delaunay.SetInputConnection(glyph.GetOutputPort())
+    surfaceFilter = vtk.vtkDataSetSurfaceFilter()
+    surfaceFilter.SetInputConnection(delaunay.GetOutputPort())
+    smoother = vtk.vtkButterflySubdivisionFilter()
+    smoother.SetInputConnection(surfaceFilter.GetOutputPort())
+    smoother.SetNumberOfSubdivisions(numberOfSubdivisions)
+    delaunaySmooth = vtk.vtkDelaunay3D()
+    delaunaySmooth.SetInputConnection(smoother.GetOutputPort())
+    smoothSurfaceFilter = vtk.vtkDataSetSurfaceFilter()
+    smoothSurfaceFilter.SetInputConnection(delaunaySmooth.GetOutputPort())
+    normals = vtk.vtkPolyDataNormals()
+    normals.SetInputConnection(smoothSurfaceFilter.GetOutputPort())
+    normals.SetFeatureAngle(100.0)
+    normals.Update()
+    return normals.GetOutput()
+
+
+#
+# MarkupsPointIndex
+#
+
+class MarkupsPointIndex(VTKObservationMixin):
+  """
+  Mirrors the control points of a markups node in a NumPy array, with a KD-tree for nearest point and radius queries.
+  The mirror is updated on point added, removed and modified events. The KD-tree is rebuilt on the first query
+  after a change, so a query costs well under a millisecond for any realistic number of contour points.
+  """
+
+  def __init__(self, markupsNode=None):
+    VTKObservationMixin.__init__(self)
+    self.markupsNode = None
+    self.points = np.zeros((0, 3))
+    self.tree = None
+    self.setMarkupsNode(markupsNode)
+
+  def setMarkupsNode(self, markupsNode):
+    self.removeObservers()
+    self.markupsNode = markupsNode
+    if markupsNode is not None:
+      self.addObserver(markupsNode, slicer.vtkMRMLMarkupsNode.PointAddedEvent, self.onPointAdded)
+      self.addObserver(markupsNode, slicer.vtkMRMLMarkupsNode.PointRemovedEvent, self.onPointRemoved)
+      self.addObserver(markupsNode, slicer.vtkMRMLMarkupsNode.PointModifiedEvent, self.onPointModified)
+      self.addObserver(markupsNode, slicer.vtkMRMLMarkupsNode.PointPositionDefinedEvent, self.onPointModified)
+    self.resync()
+
+  def setPoints(self, points):
+    self.points = np.array(points, dtype=float).reshape(-1, 3)
+    self.tree = None
+
+  def resync(self):
+    """
+    Reads all control points from the markups node.
+    """
+    if self.markupsNode is None:
+      self.setPoints(np.zeros((0, 3)))
+      return
+    self.setPoints(arrayFromMarkupsNode(self.markupsNode))
+
+  def getPointPosition(self, pointIndex):
+    position = np.zeros(3)
+    self.markupsNode.GetNthControlPointPosition(pointIndex, position)
+    return position
+
+  @vtk.calldata_type(vtk.VTK_INT)
+  def onPointAdded(self, caller, event, pointIndex):
+    if 0 <= pointIndex <= len(self.points):
+      self.points = np.insert(self.points, pointIndex, self.getPointPosition(pointIndex), axis=0)
+      self.tree = None
+    else:
+      self.resync()
+
+  @vtk.calldata_type(vtk.VTK_INT)
+  def onPointRemoved(self, caller, event, pointIndex):
+    if 0 <= pointIndex < len(self.points):
+      self.points = np.delete(self.points, pointIndex, axis=0)
+      self.tree = None
+    else:
+      self.resync()
+
+  @vtk.calldata_type(vtk.VTK_INT)
+  def onPointModified(self, caller, event, pointIndex):
+    if 0 <= pointIndex < len(self.points):
+      position = self.getPointPosition(pointIndex)
+      if not np.array_equal(position, self.points[pointIndex]):
+        self.points[pointIndex] = position
+        self.tree = None
+    else:
+      self.resync()
+
+  def getPoints(self):
+    """
+    Returns the (n, 3) array of control point positions. Resyncs if an event was missed.
+    """
+    if self.markupsNode is not None and len(self.points) != self.markupsNode.GetNumberOfControlPoints():
+      self.resync()
+    return self.points
+
+  def getTree(self):
+    points = self.getPoints()
+    if self.tree is None:
+      self.tree = cKDTree(points)
+    return self.tree
+
+  def findClosestPoint(self, position, excludeIndices=()):
+    """
+    Returns the index and position of the control point closest to position, or (-1, None) if there is none.
+    :param excludeIndices: control point indices that are skipped
+    """
+    numberOfNeighbors = min(len(self.getPoints()), 1 + len(excludeIndices))
+    if numberOfNeighbors == 0:
+      return -1, None
+    _, indices = self.getTree().query(position, k=numberOfNeighbors)
+    for index in np.atleast_1d(indices):
+      if index not in excludeIndices:
+        return int(index), self.points[index].copy()
+    return -1, None
+
+  def findPointsWithinRadius(self, position, radius):
+    """
+    Returns the sorted indices of the control points within radius of position.
+    """
+    if len(self.getPoints()) == 0:
+      return np.zeros(0, dtype=int)
+    return np.array(sorted(self.getTree().query_ball_point(position, radius)), dtype=int)
+
+
+#
+# PointGridIndex
+#
+
+class PointGridIndex:
+  """
+  Uniform grid over 3D points for fixed distance proximity queries, such as whether a breach was already marked
+  near the cautery tip. With the cell size equal to the query distance, a query only visits the 27 cells around
+  the query point, so it costs O(1) on average however many points are indexed. Points are added in O(1).
+  """
+
+  def __init__(self, cellSize=1.0):
+    self.cellSize = float(cellSize)
+    self.cells = {}
+    self.numberOfPoints = 0
+
+  def clear(self, cellSize=None):
+    if cellSize is not None:
+      self.cellSize = float(cellSize)
+    self.cells = {}
+    self.numberOfPoints = 0
+
+  def getCellKey(self, point):
+    return (int(point[0] // self.cellSize), int(point[1] // self.cellSize), int(point[2] // self.cellSize))
+
+  def addPoint(self, point):
+    point = (float(point[0]), float(point[1]), float(point[2]))
+    self.cells.setdefault(self.getCellKey(point), []).append(point)
+    self.numberOfPoints += 1
+
+  def setPoints(self, points, cellSize=None):
+    self.clear(cellSize)
+    for point in points:
+      self.addPoint(point)
+
+  def hasPointWithinDistance(self, point, distance):
+    x, y, z = float(point[0]), float(point[1]), float(point[2])
+    squaredDistance = distance * distance
+    reach = max(1, int(np.ceil(distance / self.cellSize)))
+    i, j, k = self.getCellKey((x, y, z))
+    for di in range(-reach, reach + 1):
+      for dj in range(-reach, reach + 1):
+        for dk in range(-reach, reach + 1):
+          for px, py, pz in self.cells.get((i + di, j + dj, k + dk), ()):
+            if (px - x) ** 2 + (py - y) ** 2 + (pz - z) ** 2 <= squaredDistance:
+              return True
+    return False
+
+
+#
+# LatestQueue
+#
+
+class LatestQueue:
+  """
+  Bounded queue for streaming frames. When it is full, putting a new item drops the oldest one, so a slow consumer
+  always works on recent items and the backlog cannot grow.
+  """
+
+  def __init__(self, maxsize=1):
+    self.queue = queue.Queue(maxsize=max(1, maxsize))
+    self.lock = threading.Lock()
+    self.dropped = 0
+
+  def put(self, item):
+    with self.lock:
+      while True:
+        try:
+          self.queue.put_nowait(item)
+          return
+        except queue.Full:
+          try:
+            self.queue.get_nowait()
+            self.dropped += 1
+          except queue.Empty:
+            pass
+
+  def get(self, timeout=None):
+    return self.queue.get(timeout=timeout)
+
+
+#
+# SparseBlockVolume
+#
+
+class SparseBlockVolume:
+  """
+  Voxel grid that compounds tracked 2D image frames, allocating only the fixed size blocks that frames touch.
+  The grid has no preset bounds, so it grows with the scanned region and memory follows the scanned volume
+  instead of a bounding ROI. Voxel (i, j, k) is centered at spacing * (i, j, k) in volume coordinates.
+  Frames that would grow the volume beyond maximumSize along any axis, e.g. mistracked ones, are rejected.
+
+  Compounding modes:
+  - nearest: each pixel is added to its nearest voxel, voxels store the mean of their pixels
+  - linear: each pixel is distributed to its 8 surrounding voxels with trilinear weights, voxels store the weighted mean
+  - max: each voxel stores the maximum of the pixels nearest to it
+  """
+
+  NEAREST = "nearest"
+  LINEAR = "linear"
+  MAXIMUM = "max"
+  MODES = (NEAREST, LINEAR, MAXIMUM)
+
+  def __init__(self, spacing=1.0, blockSize=16, mode=LINEAR, maximumSize=200.0):
+    if mode not in self.MODES:
+      raise ValueError(f"Unknown compounding mode: {mode}")
+    self.spacing = float(spacing)
+    self.blockSize = int(blockSize)
+    self.mode = mode
+    self.maximumSize = float(maximumSize)
+    self.reset()
+
+  def reset(self):
+    self.blocks = {}  # block index (i, j, k) -> (values, weights), float32 arrays indexed [i, j, k] inside the block
+    self.modifiedBlockIndices = set()
+    self.firstBlock = None
+    self.lastBlock = None
+    self.numberOfFrames = 0
+    self.numberOfRejectedFrames = 0
+    self.numberOfPixels = 0
+    self.insertTimeSeconds = 0.0
+
+  def getVoxelPositions(self, rows, columns, imageIjkToVolume):
+    """
+    :returns: list of 3 flat float32 arrays, the continuous voxel coordinates of all pixels along each axis
+    """
+    imageIjkToVoxel = (np.asarray(imageIjkToVolume, dtype=np.float64)[:3] / self.spacing).astype(np.float32)
+    columnIndices = np.arange(columns, dtype=np.float32)
+    rowIndices = np.arange(rows, dtype=np.float32)
+    return [(rowIndices[:, np.newaxis] * imageIjkToVoxel[axis, 1] + imageIjkToVoxel[axis, 3]
+             + columnIndices[np.newaxis, :] * imageIjkToVoxel[axis, 0]).ravel() for axis in range(3)]
+
+  def insertFrame(self, image, imageIjkToVolume):
+    """
+    Compounds one image frame into the volume.
+    :param image: array of pixel values indexed [j, i] or [0, j, i], as returned by slicer.util.arrayFromVolume
+    :param imageIjkToVolume: 4x4 array, image IJK to volume coordinates
+    :returns: bool, False if the frame was rejected for growing the volume beyond maximumSize
+    """
+    startTime = time.perf_counter()
+    rows, columns = image.shape[-2:]
+    values = np.asarray(image, dtype=np.float32).reshape(-1)
+    positions = self.getVoxelPositions(rows, columns, imageIjkToVolume)
+    if self.mode == self.LINEAR:
+      baseVoxels = [np.floor(axisPositions) for axisPositions in positions]
+      fractions = [axisPositions - axisBase for axisPositions, axisBase in zip(positions, baseVoxels)]
+      baseVoxels = [axisBase.astype(np.int64) for axisBase in baseVoxels]
+      lastVoxel = np.array([axisBase.max() + 1 for axisBase in baseVoxels])
+    else:
+      baseVoxels = [np.rint(axisPositions).astype(np.int64) for axisPositions in positions]
+      lastVoxel = np.array([axisBase.max() for axisBase in baseVoxels])
+
+    # Pixels are binned into a dense box of the blocks around the frame, where each voxel has a flat index
+    blockSize = self.blockSize
+    firstBlock = np.array([axisBase.min() for axisBase in baseVoxels]) // blockSize
+    lastBlock = lastVoxel // blockSize
+    if self.firstBlock is not None:
+      extentBlockCounts = np.maximum(lastBlock, self.lastBlock) - np.minimum(firstBlock, self.firstBlock) + 1
+    else:
+      extentBlockCounts = lastBlock - firstBlock + 1
+    if np.any(extentBlockCounts * blockSize * self.spacing > self.maximumSize):
+      self.numberOfRejectedFrames += 1
+      self.insertTimeSeconds += time.perf_counter() - startTime
+      return False
+    blockCounts = lastBlock - firstBlock + 1
+    boxShape = blockCounts * blockSize
+    boxOrigin = firstBlock * blockSize
+    flatIndices = (((baseVoxels[0] - boxOrigin[0]) * boxShape[1] + (baseVoxels[1] - boxOrigin[1])) * boxShape[2]
+                   + (baseVoxels[2] - boxOrigin[2]))
+    boxSize = int(np.prod(boxShape))
+
+    if self.mode == self.LINEAR:
+      # Trilinear corners are at fixed flat index offsets from the base voxel, so each corner is binned at the
+      # base voxel and shifted into place
+      boxWeights = np.zeros(boxSize)
+      boxValues = np.zeros(boxSize)
+      axisWeights = [(1.0 - axisFractions, axisFractions) for axisFractions in fractions]
+      for cornerI, cornerJ, cornerK in np.ndindex(2, 2, 2):
+        cornerWeights = axisWeights[0][cornerI] * axisWeights[1][cornerJ] * axisWeights[2][cornerK]
+        offset = (cornerI * boxShape[1] + cornerJ) * boxShape[2] + cornerK
+        boxWeights[offset:] += np.bincount(flatIndices, weights=cornerWeights, minlength=boxSize)[:boxSize - offset]
+        boxValues[offset:] += np.bincount(flatIndices, weights=cornerWeights * values, minlength=boxSize)[:boxSize - offset]
+    elif self.mode == self.NEAREST:
+      boxWeights = np.bincount(flatIndices, minlength=boxSize)
+      boxValues = np.bincount(flatIndices, weights=values, minlength=boxSize)
+    else:
+      boxWeights = np.bincount(flatIndices, minlength=boxSize)
+      order = np.argsort(flatIndices)
+      sortedIndices = flatIndices[order]
+      starts = np.flatnonzero(np.concatenate(([True], sortedIndices[1:] != sortedIndices[:-1])))
+      boxValues = np.full(boxSize, -np.inf, dtype=np.float32)
+      boxValues[sortedIndices[starts]] = np.maximum.reduceat(values[order], starts)
+
+    self.addBox(boxValues, boxWeights, firstBlock, blockCounts)
+    self.numberOfFrames += 1
+    self.numberOfPixels += len(values)
+    self.insertTimeSeconds += time.perf_counter() - startTime
+    return True
+
+  def addBox(self, boxValues, boxWeights, firstBlock, blockCounts):
+    """
+    Adds the blocks of a dense box that received any pixels, allocating them if needed.
+    :param boxValues: flat array of the box, weighted value sums or maxima depending on the mode
+    :param boxWeights: flat array of the box, weight sums
+    """
+    blockSize = self.blockSize
+    boxBlocksShape = (blockCounts[0], blockSize, blockCounts[1], blockSize, blockCounts[2], blockSize)
+    boxValues = boxValues.reshape(boxBlocksShape)
+    boxWeights = boxWeights.reshape(boxBlocksShape)
+    touchedBlocks = np.argwhere(boxWeights.any(axis=(1, 3, 5)))
+    blockShape = (blockSize, blockSize, blockSize)
+    for bi, bj, bk in touchedBlocks.tolist():
+      blockIndex = (firstBlock[0] + bi, firstBlock[1] + bj, firstBlock[2] + bk)
+      block = self.blocks.get(blockIndex)
+      if block is None:
+        initialValue = -np.inf if self.mode == self.MAXIMUM else 0.0
+        block = (np.full(blockShape, initialValue, dtype=np.float32), np.zeros(blockShape, dtype=np.float32))
+        self.blocks[blockIndex] = block
+        if self.firstBlock is None:
+          self.firstBlock = np.array(blockIndex)
+          self.lastBlock = np.array(blockIndex)
+        else:
+          self.firstBlock = np.minimum(self.firstBlock, blockIndex)
+          self.lastBlock = np.maximum(self.lastBlock, blockIndex)
+      self.modifiedBlockIndices.add(blockIndex)
+      blockValues, blockWeights = block
+      if self.mode == self.MAXIMUM:
+        np.maximum(blockValues, boxValues[bi, :, bj, :, bk, :], out=blockValues)
+      else:
+        blockValues += boxValues[bi, :, bj, :, bk, :]
+      blockWeights += boxWeights[bi, :, bj, :, bk, :]
+
+  def getCompoundedBlock(self, blockIndex):
+    values, weights = self.blocks[blockIndex]
+    observed = weights > 0
+    if self.mode == self.MAXIMUM:
+      return np.where(observed, values, 0.0)
+    return np.divide(values, weights, out=np.zeros_like(values), where=observed)
+
+  def getBlockRange(self):
+    """
+    :returns: (first, last) block index arrays of the bounding box of all allocated blocks, or None if empty
+    """
+    if self.firstBlock is None:
+      return None
+    return self.firstBlock.copy(), self.lastBlock.copy()
+
+  def popModifiedBlocks(self):
+    """
+    Returns the compounded values of blocks modified since the previous call, so that a dense copy of the volume can
+    be updated incrementally.
+    :returns: dict of block index (i, j, k) -> float32 array of the block indexed [k, j, i]
+    """
+    modifiedBlocks = {blockIndex: self.getCompoundedBlock(blockIndex).transpose(2, 1, 0)
+                      for blockIndex in self.modifiedBlockIndices}
+    self.modifiedBlockIndices = set()
+    return modifiedBlocks
+
+  def getMemoryUsage(self):
+    """
+    :returns: int, bytes used by allocated blocks
+    """
+    return sum(values.nbytes + weights.nbytes for values, weights in self.blocks.values())
+
+  def getStatistics(self):
+    """
+    :returns: dict with number of inserted and rejected frames and of blocks, memory use in MB of the blocks and of a
+      dense grid over their bounding box, and insert throughput in frames and megapixels per second
+    """
+    blockRange = self.getBlockRange()
+    denseVoxelCount = 0 if blockRange is None else int(np.prod((blockRange[1] - blockRange[0] + 1) * self.blockSize))
+    insertTime = max(self.insertTimeSeconds, 1e-9)
+    return {
+      "mode": self.mode,
+      "frames": self.numberOfFrames,
+      "rejectedFrames": self.numberOfRejectedFrames,
+      "blocks": len(self.blocks),
+      "memoryMB": self.getMemoryUsage() / 1e6,
+      "denseMemoryMB": denseVoxelCount * 2 * np.dtype(np.float32).itemsize / 1e6,
+      "framesPerSecond": self.numberOfFrames / insertTime,
+      "megapixelsPerSecond": self.numberOfPixels / insertTime / 1e6,
+    }
+
+
 #
 # LumpNav2Logic
 #
@@ -1600,6 +2268,12 @@ class LumpNav2Logic(ScriptedLoadableModuleLogic, VTKObservationMixin):
   DEFAULT_SMOOTH = 15
   DEFAULT_DECIMATE = 0.25
   AI_VISIBLE = "AIVisible"
+  COMPOUNDING_MODE_SETTING = "LumpNav2/CompoundingMode"
+  COMPOUNDING_SPACING_MM = 1.0
+  COMPOUNDING_BLOCK_SIZE = 16
+  COMPOUNDING_DISPLAY_INTERVAL_MS = 500
+  COMPOUNDING_QUEUE_SIZE = 4  # frames waiting to be compounded, older frames are dropped when it is full
+  COMPOUNDING_MAXIMUM_SIZE_MM = 200.0  # frames that would grow the volume beyond this are rejected
 
   # Layout codes
   LAYOUT_2D3D = 501
@@ -1612,6 +2286,9 @@ class LumpNav2Logic(ScriptedLoadableModuleLogic, VTKObservationMixin):
   TRACKING_SEQUENCE_BROWSER = "TrackingSequenceBrowser"
   ULTRASOUND_SEQUENCE_BROWSER = "UltrasoundSequenceBrowser"
   TUMOR_MARKUPS_NEEDLE = "TumorMarkups_Needle"
+  TUMOR_REBUILD_DELAY_MS = 100  # Markup changes within this interval are coalesced into one tumor model rebuild
+  TUMOR_REBUILD_POLL_MS = 20
+  THREE_D_VIEWS_RENDER_INTERVAL_MS = 16  # Render requests for the 3D views are coalesced at about display refresh rate
   BREACH_WARNING = "LumpNavBreachWarning"
   BREACH_MARKUPS_NEEDLE = "BreachMarkups_Needle"
   EVENT_TABLE_NODE = "EventTableNode"
@@ -1638,6 +2315,40 @@ class LumpNav2Logic(ScriptedLoadableModuleLogic, VTKObservationMixin):
 
     self.predictionStarted = False
     self.reconstructionLogic = slicer.modules.volumereconstruction.logic()
+    # Live reconstruction uses SparseBlockVolume, or the Volume Reconstruction module if False
+    self.useSparseCompounding = True
+    self.compoundingVolume = None
+    self.compoundingQueue = None
+    self.compoundingThread = None
+    self.compoundingLock = threading.Lock()
+    self.compoundingDisplayPending = False
+    self.compoundingDisplayTimer = None
+    self.compoundingPollTimer = None
+    self.compoundingVoxels = None
+    self.compoundingVoxelsFirstBlock = None
+
+    self.cauteryClassificationLogic = None
+    self.cauteryStateTextNode = None
+    self.cauteryStateTextActors = {}
+
+    self.tumorHullBuilder = TumorHullBuilder()
+    self.tumorPointIndex = MarkupsPointIndex()
+    self.breachPointIndex = PointGridIndex()
+    self.breachState = None
+    self.breachMarkupsProximityThreshold = None
+    self.threeDViewsRenderTimer = None
+
+    self.surfaceExtractionCliNode = None
+    self.surfaceExtractionModel = None
+    self.surfaceExtractionId = 0
+    self.surfaceExtractionThread = None
+    self.surfaceExtractionResults = {}
+    self.surfaceExtractionPollTimer = None
+    self.tumorRebuildThread = None
+    self.tumorRebuildResult = None
+    self.tumorRebuildPending = False
+    self.tumorRebuildTimer = None
+    self.tumorRebuildPollTimer = None
 
   def resourcePath(self, filename):
     """
@@ -1890,6 +2601,8 @@ class LumpNav2Logic(ScriptedLoadableModuleLogic, VTKObservationMixin):
       tumorMarkups_Needle.GetDisplayNode().VisibilityOff()
       parameterNode.SetNodeReferenceID(self.TUMOR_MARKUPS_NEEDLE, tumorMarkups_Needle.GetID())
     tumorMarkups_Needle.SetAndObserveTransformNodeID(needleToReference.GetID())
+    self.tumorHullBuilder = TumorHullBuilder()
+    self.tumorPointIndex.setMarkupsNode(tumorMarkups_Needle)
     self.removeObservers(method=self.onTumorMarkupsNodeModified)
     self.addObserver(tumorMarkups_Needle, slicer.vtkMRMLMarkupsNode.PointPositionDefinedEvent, self.modifyPoints)
     self.addObserver(tumorMarkups_Needle, slicer.vtkMRMLMarkupsNode.PointRemovedEvent, self.onTumorMarkupsNodeModified)
@@ -2067,6 +2780,7 @@ class LumpNav2Logic(ScriptedLoadableModuleLogic, VTKObservationMixin):
       parameterNode.SetNodeReferenceID(self.BREACH_MARKUPS_NEEDLE, breachMarkups_Needle.GetID())
     breachMarkups_Needle.SetAndObserveTransformNodeID(needleToReference.GetID())
     parameterNode.SetParameter(self.BREACH_STATUS, "False")
+    self.breachState = None
 
     cauteryCameraToCautery = parameterNode.GetNodeReference(self.CAUTERYCAMERA_TO_CAUTERY)
     if cauteryCameraToCautery is None:
@@ -2315,19 +3029,28 @@ class LumpNav2Logic(ScriptedLoadableModuleLogic, VTKObservationMixin):
     if toggled:
       predictionConnectorNode = parameterNode.GetNodeReference(self.PREDICTION_CONNECTOR_NODE)
       if predictionConnectorNode and predictionConnectorNode.GetState() == predictionConnectorNode.StateConnected:
+        # Surface extraction from the previous scan is outdated now
+        self.cancelSurfaceExtraction()
         logging.info("Starting volume reconstruction")
         self.predictionStarted = True
         self.setRegionOfInterestNode()
-        reconstructionNode = self.setVolumeReconstructionNode()
-        self.reconstructionLogic.StartLiveVolumeReconstruction(reconstructionNode)
+        if self.useSparseCompounding:
+          self.startCompounding()
+        else:
+          reconstructionNode = self.setVolumeReconstructionNode()
+          self.reconstructionLogic.StartLiveVolumeReconstruction(reconstructionNode)
 
     else:
       if self.predictionStarted == True:
         logging.info("Stopping volume reconstruction")
-        reconstructionNode = parameterNode.GetNodeReference(self.RECONSTRUCTION_NODE)
-        self.reconstructionLogic.StopLiveVolumeReconstruction(reconstructionNode)
-        # Convert to convex hull
-        self.createConvexHullFromVolume()
+        if self.compoundingThread is not None:
+          # Builds the convex hull when the queued frames are compounded
+          self.stopCompounding()
+        else:
+          reconstructionNode = parameterNode.GetNodeReference(self.RECONSTRUCTION_NODE)
+          self.reconstructionLogic.StopLiveVolumeReconstruction(reconstructionNode)
+          # Convert to convex hull
+          self.createConvexHullFromVolume()
         self.predictionStarted = False
 
   def setUltrasoundSequenceBrowser(self, isRecording):
@@ -2396,7 +3119,14 @@ class LumpNav2Logic(ScriptedLoadableModuleLogic, VTKObservationMixin):
       reconstructionNode.SetAndObserveInputVolumeNode(parameterNode.GetNodeReference(self.PREDICTION_VOLUME))
       reconstructionNode.SetAndObserveInputROINode(parameterNode.GetNodeReference(self.ROI_NODE))
 
-    # Create volume node for reconstruction output
+    reconstructionNode.SetAndObserveOutputVolumeNode(self.getReconstructionVolume())
+    return reconstructionNode
+
+  def getReconstructionVolume(self):
+    """
+    Returns the volume node for live reconstruction output, in needle coordinates. Creates it if needed.
+    """
+    parameterNode = self.getParameterNode()
     reconstructionVolume = parameterNode.GetNodeReference(self.RECONSTRUCTION_VOLUME)
     if reconstructionVolume is None:
       reconstructionVolume = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLScalarVolumeNode", self.RECONSTRUCTION_VOLUME)
@@ -2404,17 +3134,175 @@ class LumpNav2Logic(ScriptedLoadableModuleLogic, VTKObservationMixin):
       parameterNode.SetNodeReferenceID(self.RECONSTRUCTION_VOLUME, reconstructionVolume.GetID())
 
       reconstructionVolume.SetAndObserveTransformNodeID(None)
-      reconstructionNode.SetAndObserveOutputVolumeNode(reconstructionVolume)
 
       volRenLogic = slicer.modules.volumerendering.logic()
       volRenDisplayNode = volRenLogic.CreateDefaultVolumeRenderingNodes(reconstructionVolume)
       volRenDisplayNode.SetAndObserveROINodeID(parameterNode.GetNodeReference(self.ROI_NODE).GetID())
       reconstructionVolume.SetDisplayVisibility(False)
+    return reconstructionVolume
 
-    return reconstructionNode
+  def startCompounding(self):
+    """
+    Starts compounding tracked Prediction frames into a SparseBlockVolume in needle coordinates. Frames are inserted
+    in a worker thread in arrival order, and ReconstructionVolume and the ROI follow the compounded volume.
+    """
+    if self.isCompounding():
+      logging.info("Compounding of prediction frames is already running")
+      return
+    mode = slicer.util.settingsValue(self.COMPOUNDING_MODE_SETTING, SparseBlockVolume.LINEAR)
+    if mode not in SparseBlockVolume.MODES:
+      logging.warning(f"Unknown compounding mode {mode}, using {SparseBlockVolume.LINEAR}")
+      mode = SparseBlockVolume.LINEAR
+    # A previous scan that is still being finished is abandoned. Its queue already ends with None, so its worker
+    # exits after the queued frames.
+    if self.compoundingPollTimer is not None:
+      self.compoundingPollTimer.stop()
+    self.compoundingVolume = SparseBlockVolume(self.COMPOUNDING_SPACING_MM, self.COMPOUNDING_BLOCK_SIZE, mode,
+                                               self.COMPOUNDING_MAXIMUM_SIZE_MM)
+    self.compoundingQueue = LatestQueue(self.COMPOUNDING_QUEUE_SIZE)
+    self.compoundingVoxels = None
+    self.compoundingVoxelsFirstBlock = None
+    self.compoundingThread = threading.Thread(target=self.compoundFrames, args=(self.compoundingVolume, self.compoundingQueue),
+                                              name="PredictionCompounding", daemon=True)
+    self.compoundingThread.start()
+
+    predictionVolume = self.getParameterNode().GetNodeReference(self.PREDICTION_VOLUME)
+    self.addObserver(predictionVolume, slicer.vtkMRMLVolumeNode.ImageDataModifiedEvent, self.onPredictionImageModified)
+
+    if self.compoundingDisplayTimer is None:
+      self.compoundingDisplayTimer = qt.QTimer()
+      self.compoundingDisplayTimer.setInterval(self.COMPOUNDING_DISPLAY_INTERVAL_MS)
+      self.compoundingDisplayTimer.connect('timeout()', self.onCompoundingDisplayTimer)
+    self.compoundingDisplayPending = False
+    self.compoundingDisplayTimer.start()
+    logging.info(f"Started {mode} compounding of prediction frames")
+
+  def stopCompounding(self):
+    """
+    Stops observing prediction frames. The worker compounds the frames still queued, then onCompoundingPollTimer
+    updates ReconstructionVolume and builds TumorModelAI from it.
+    """
+    if not self.isCompounding():
+      return
+    self.removeObservers(method=self.onPredictionImageModified)
+    self.compoundingDisplayTimer.stop()
+    self.compoundingQueue.put(None)
+    if self.compoundingPollTimer is None:
+      self.compoundingPollTimer = qt.QTimer()
+      self.compoundingPollTimer.setInterval(self.TUMOR_REBUILD_POLL_MS)
+      self.compoundingPollTimer.connect('timeout()', self.onCompoundingPollTimer)
+    self.compoundingPollTimer.start()
+
+  def isCompounding(self):
+    """
+    Returns True while prediction frames are being compounded, i.e. after startCompounding and before
+    stopCompounding. A stopped scan whose queued frames are still being inserted is not compounding.
+    """
+    isFinishing = self.compoundingPollTimer is not None and self.compoundingPollTimer.isActive()
+    return self.compoundingThread is not None and self.compoundingThread.is_alive() and not isFinishing
+
+  def onCompoundingPollTimer(self):
+    if self.compoundingThread.is_alive():
+      return
+    self.compoundingPollTimer.stop()
+    droppedFrames = self.compoundingQueue.dropped
+    self.compoundingThread = None
+    self.compoundingQueue = None
+    self.updateReconstructionVolumeFromCompounding()
+    logging.info("Compounded {frames} prediction frames ({mode}) into {blocks} blocks of {memoryMB:.1f} MB, "
+                 "{denseMemoryMB:.1f} MB as a dense volume. Insert rate {framesPerSecond:.1f} frames/s, "
+                 "{megapixelsPerSecond:.1f} Mpixel/s. Rejected {rejectedFrames} frames out of bounds, "
+                 "dropped {droppedFrames} frames while busy".format(droppedFrames=droppedFrames,
+                                                                    **self.compoundingVolume.getStatistics()))
+    self.createConvexHullFromVolume()
+
+  def compoundFrames(self, compoundingVolume, frameQueue):
+    while True:
+      frame = frameQueue.get()
+      if frame is None:
+        return
+      # A failing frame must not end the worker, or the scan could not be stopped
+      try:
+        with self.compoundingLock:
+          compoundingVolume.insertFrame(*frame)
+      except Exception as e:
+        logging.error(f"Compounding prediction frame failed: {e}")
+
+  def onPredictionImageModified(self, caller, event):
+    self.compoundingQueue.put(self.getPredictionFrame())
+    self.compoundingDisplayPending = True
+
+  def getPredictionFrame(self):
+    """
+    :returns: tuple of a copy of the current Prediction pixels and its 4x4 IJK to needle matrix
+    """
+    parameterNode = self.getParameterNode()
+    predictionVolume = parameterNode.GetNodeReference(self.PREDICTION_VOLUME)
+    predToTransd = parameterNode.GetNodeReference(self.PREDICTION_TO_TRANSD)
+    transdToNeedle = parameterNode.GetNodeReference(self.TRANSD_TO_NEEDLE)
+    ijkToRas = vtk.vtkMatrix4x4()
+    predictionVolume.GetIJKToRASMatrix(ijkToRas)
+    ijkToNeedle = (slicer.util.arrayFromTransformMatrix(transdToNeedle)
+                   @ slicer.util.arrayFromTransformMatrix(predToTransd)
+                   @ slicer.util.arrayFromVTKMatrix(ijkToRas))
+    return slicer.util.arrayFromVolume(predictionVolume).copy(), ijkToNeedle
+
+  def onCompoundingDisplayTimer(self):
+    if self.compoundingDisplayPending:
+      self.compoundingDisplayPending = False
+      self.updateReconstructionVolumeFromCompounding()
+
+  def updateReconstructionVolumeFromCompounding(self):
+    """
+    Copies the blocks compounded since the previous update to ReconstructionVolume. The volume is only reallocated,
+    and the ROI fitted to it, when the compounded volume grows.
+    """
+    with self.compoundingLock:
+      blockRange = self.compoundingVolume.getBlockRange()
+      modifiedBlocks = self.compoundingVolume.popModifiedBlocks()
+    if blockRange is None or not modifiedBlocks:
+      return
+    firstBlock, lastBlock = blockRange
+    blockSize = self.compoundingVolume.blockSize
+    spacing = self.compoundingVolume.spacing
+    reconstructionVolume = self.getReconstructionVolume()
+
+    voxels = self.compoundingVoxels
+    shape = tuple((lastBlock - firstBlock + 1)[::-1] * blockSize)
+    if voxels is None or voxels.shape != shape or np.any(self.compoundingVoxelsFirstBlock != firstBlock):
+      grownVoxels = np.zeros(shape, dtype=np.float32)
+      if voxels is not None:
+        i, j, k = (self.compoundingVoxelsFirstBlock - firstBlock) * blockSize
+        grownVoxels[k:k + voxels.shape[0], j:j + voxels.shape[1], i:i + voxels.shape[2]] = voxels
+      origin = firstBlock * blockSize * spacing
+      reconstructionVolume.SetIJKToRASDirectionMatrix(vtk.vtkMatrix4x4())
+      reconstructionVolume.SetSpacing(spacing, spacing, spacing)
+      reconstructionVolume.SetOrigin(origin)
+      slicer.util.updateVolumeFromArray(reconstructionVolume, grownVoxels)
+      voxels = slicer.util.arrayFromVolume(reconstructionVolume)
+      self.compoundingVoxels = voxels
+      self.compoundingVoxelsFirstBlock = firstBlock
+
+      roiNode = self.getParameterNode().GetNodeReference(self.ROI_NODE)
+      if roiNode is not None:
+        size = np.array(shape[::-1]) * spacing
+        roiNode.SetXYZ(origin + (size - spacing) / 2)
+        roiNode.SetRadiusXYZ(size / 2)
+
+    for blockIndex, blockVoxels in modifiedBlocks.items():
+      i, j, k = (np.array(blockIndex) - firstBlock) * blockSize
+      voxels[k:k + blockSize, j:j + blockSize, i:i + blockSize] = blockVoxels
+    slicer.util.arrayFromVolumeModified(reconstructionVolume)
   
-  def createConvexHullFromVolume(self):
+  def createConvexHullFromVolume(self, useCli=False):
+    """
+    Starts building TumorModelAI from the reconstructed volume without blocking the UI.
+    By default the surface is extracted in-process in a worker thread, from a copy of the reconstructed image.
+    With useCli, the Grayscale Model Maker CLI runs in the background and its result is post-processed in a worker
+    thread. Progress is shown in the status bar. A new scan or a new extraction cancels the running one.
+    """
     logging.info("Creating surface model from volume")
+    self.cancelSurfaceExtraction()
 
     parameterNode = self.getParameterNode()
     reconstructionVolume = parameterNode.GetNodeReference(self.RECONSTRUCTION_VOLUME)
@@ -2430,46 +3318,319 @@ class LumpNav2Logic(ScriptedLoadableModuleLogic, VTKObservationMixin):
     displayNode.BackfaceCullingOff()
     displayNode.SetSliceIntersectionThickness(4)
 
-    # Set up grayscale model maker CLI node
-    parameters = {
-        "InputVolume": reconstructionVolume.GetID(),
-        "OutputGeometry": tumorModelAI.GetID(),
+    if not useCli:
+      imageData = vtk.vtkImageData()
+      imageData.DeepCopy(reconstructionVolume.GetImageData())
+      ijkToRas = vtk.vtkMatrix4x4()
+      reconstructionVolume.GetIJKToRASMatrix(ijkToRas)
+      threshold = float(parameterNode.GetParameter(self.AI_THRESHOLD))
+      discrete = reconstructionVolume.IsA("vtkMRMLLabelMapVolumeNode")
+      self.startSurfaceWorker(lambda: self.createConvexTumorSurface(self.extractSurfaceFromImage(
+        imageData, ijkToRas, threshold, self.DEFAULT_SMOOTH, self.DEFAULT_DECIMATE, discrete)))
+      return
+
+    # CLI output goes to a hidden model, so TumorModelAI keeps its previous surface until the new one is ready
+    surfaceModel = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLModelNode", self.TUMOR_MODEL_AI + "_Surface")
+    surfaceModel.SaveWithSceneOff()
+    surfaceModel.HideFromEditorsOn()
+    self.surfaceExtractionModel = surfaceModel
+
+    # Run the CLI in the background
+    parameters = self.getGrayscaleModelMakerParameters(reconstructionVolume, surfaceModel)
+    modelMaker = slicer.modules.grayscalemodelmaker
+    self.surfaceExtractionCliNode = slicer.cli.run(modelMaker, None, parameters, wait_for_completion=False, update_display=False)
+    self.addObserver(self.surfaceExtractionCliNode, slicer.vtkMRMLCommandLineModuleNode.StatusModifiedEvent, self.onSurfaceExtractionCliModified)
+    self.addObserver(self.surfaceExtractionCliNode, vtk.vtkCommand.ModifiedEvent, self.onSurfaceExtractionCliModified)
+
+  def onSurfaceExtractionCliModified(self, cliNode, event):
+    if cliNode is not self.surfaceExtractionCliNode:
+      return
+    if cliNode.IsBusy():
+      slicer.util.showStatusMessage(f"Building AI tumor model: {cliNode.GetStatusString()} {cliNode.GetProgress():.0f}%")
+      return
+
+    self.removeObservers(method=self.onSurfaceExtractionCliModified)
+    self.surfaceExtractionCliNode = None
+    status = cliNode.GetStatus()
+    if status & cliNode.ErrorsMask:
+      logging.error("CLI execution failed: " + cliNode.GetErrorText())
+      slicer.util.showStatusMessage("Building AI tumor model failed.", 5000)
+    elif status == cliNode.Completed:
+      # Connectivity, cleaning and convex hull run in a worker thread on a copy of the CLI output
+      surfacePolyData = vtk.vtkPolyData()
+      surfacePolyData.DeepCopy(self.surfaceExtractionModel.GetPolyData())
+      self.startSurfaceWorker(lambda: self.createConvexTumorSurface(surfacePolyData))
+    # The CLI node is still sending this event, so it is removed once control returns to the event loop
+    qt.QTimer.singleShot(0, lambda: slicer.mrmlScene.RemoveNode(cliNode))
+    self.removeSurfaceExtractionModel()
+
+  def getGrayscaleModelMakerParameters(self, volumeNode, modelNode):
+    parameterNode = self.getParameterNode()
+    return {
+        "InputVolume": volumeNode.GetID(),
+        "OutputGeometry": modelNode.GetID(),
         "Threshold": float(parameterNode.GetParameter(self.AI_THRESHOLD)),
         "Smooth": self.DEFAULT_SMOOTH,
         "Decimate": self.DEFAULT_DECIMATE,
         "SplitNormals": True,
         "PointNormals": True
     }
-    modelMaker = slicer.modules.grayscalemodelmaker
 
-    # Run the CLI
-    cliNode = slicer.cli.runSync(modelMaker, None, parameters)
+  def startSurfaceWorker(self, computeSurface):
+    """
+    Runs computeSurface in a worker thread and sets its result on TumorModelAI when it is done.
+    :param computeSurface: callable returning vtkPolyData, must not touch the MRML scene
+    """
+    slicer.util.showStatusMessage("Building AI tumor model: surface")
+    self.surfaceExtractionId += 1
+    extractionId = self.surfaceExtractionId
+
+    def compute():
+      try:
+        # Results are keyed by extraction, so a superseded worker finishing late cannot replace the current result
+        self.surfaceExtractionResults[extractionId] = computeSurface()
+      except Exception as e:
+        logging.error(f"AI tumor model extraction failed: {e}")
 
-    # Process results
-    if cliNode.GetStatus() & cliNode.ErrorsMask:
-        # error
-        errorText = cliNode.GetErrorText()
-        slicer.mrmlScene.RemoveNode(cliNode)
-        raise ValueError("CLI execution failed: " + errorText)
-    # success
-    slicer.mrmlScene.RemoveNode(cliNode)
+    self.surfaceExtractionThread = threading.Thread(target=compute, name="TumorModelAIExtraction", daemon=True)
+    self.surfaceExtractionThread.start()
+
+    if self.surfaceExtractionPollTimer is None:
+      self.surfaceExtractionPollTimer = qt.QTimer()
+      self.surfaceExtractionPollTimer.setInterval(self.TUMOR_REBUILD_POLL_MS)
+      self.surfaceExtractionPollTimer.connect('timeout()', self.onSurfaceExtractionPollTimer)
+    self.surfaceExtractionPollTimer.start()
+
+  def onSurfaceExtractionPollTimer(self):
+    if self.surfaceExtractionThread is not None and self.surfaceExtractionThread.is_alive():
+      return
+    self.surfaceExtractionPollTimer.stop()
+    # Results of cancelled and superseded extractions are discarded
+    surfacePolyData = self.surfaceExtractionResults.pop(self.surfaceExtractionId, None)
+    self.surfaceExtractionResults.clear()
+    if surfacePolyData is None:
+      return
+    tumorModelAI = self.getParameterNode().GetNodeReference(self.TUMOR_MODEL_AI)
+    tumorModelAI.SetAndObservePolyData(surfacePolyData)
+    slicer.util.showStatusMessage("AI tumor model ready.", 3000)
+
+  def cancelSurfaceExtraction(self):
+    """
+    Cancels a running surface extraction. A post-processing thread cannot be stopped, but its result is discarded.
+    """
+    self.surfaceExtractionId += 1
+    cliNode = self.surfaceExtractionCliNode
+    if cliNode is not None:
+      self.removeObservers(method=self.onSurfaceExtractionCliModified)
+      self.surfaceExtractionCliNode = None
+      if cliNode.IsBusy():
+        logging.info("Cancelling AI tumor model extraction")
+        cliNode.Cancel()
+      slicer.mrmlScene.RemoveNode(cliNode)
+    self.removeSurfaceExtractionModel()
+
+  def removeSurfaceExtractionModel(self):
+    if self.surfaceExtractionModel is not None:
+      slicer.mrmlScene.RemoveNode(self.surfaceExtractionModel)
+      self.surfaceExtractionModel = None
+
+  @staticmethod
+  def createConvexTumorSurface(surfacePolyData):
+    """
+    Keeps the largest connected part of a surface and returns its convex hull as a closed triangle mesh.
+    Surface points are not voxel decimated first, Qhull is faster on them as they are (see benchmarkConvexHull).
+    """
+    if surfacePolyData.GetNumberOfPoints() < 4:
+      return surfacePolyData
 
     # Extract largest portion
     connectivityFilter = vtk.vtkPolyDataConnectivityFilter()
-    connectivityFilter.SetInputData(tumorModelAI.GetPolyData())
+    connectivityFilter.SetInputData(surfacePolyData)
     connectivityFilter.SetExtractionModeToLargestRegion()
 
-    # Clean up model
+    # Drop points not used by the largest portion
     cleanFilter = vtk.vtkCleanPolyData()
     cleanFilter.SetInputConnection(connectivityFilter.GetOutputPort())
+    cleanFilter.Update()
+    if cleanFilter.GetOutput().GetNumberOfPoints() < 4:
+      return cleanFilter.GetOutput()
 
     # Convert to convex hull
-    convexHull = vtk.vtkDelaunay3D()
-    convexHull.SetInputConnection(cleanFilter.GetOutputPort())
-    outerSurface = vtk.vtkGeometryFilter()
-    outerSurface.SetInputConnection(convexHull.GetOutputPort())
-    outerSurface.Update()
-    tumorModelAI.SetAndObservePolyData(outerSurface.GetOutput())
+    points = numpy_support.vtk_to_numpy(cleanFilter.GetOutput().GetPoints().GetData())
+    return convexHullPolyData(points)
+
+  @staticmethod
+  def extractSurfaceFromImage(imageData, ijkToRas, threshold, smooth, decimate, discrete=False):
+    """
+    In-process counterpart of the Grayscale Model Maker CLI, with the same filter settings: iso-surface at threshold,
+    decimation, windowed sinc smoothing, IJK to RAS transform and split point normals.
+    :param imageData: vtkImageData of the volume, in IJK coordinates
+    :param ijkToRas: vtkMatrix4x4 of the volume
+    :param smooth: int, number of smoothing iterations
+    :param decimate: float, target reduction of the number of triangles
+    :param discrete: bool, use discrete flying edges for label maps
+    """
+    surface = vtk.vtkDiscreteFlyingEdges3D() if discrete else vtk.vtkFlyingEdges3D()
+    surface.SetInputData(imageData)
+    surface.SetValue(0, threshold)
+    surface.ComputeNormalsOff()
+    surface.ComputeGradientsOff()
+    surface.ComputeScalarsOff()
+
+    decimator = vtk.vtkDecimatePro()
+    decimator.SetInputConnection(surface.GetOutputPort())
+    decimator.SetFeatureAngle(60)
+    decimator.SplittingOff()
+    decimator.PreserveTopologyOn()
+    decimator.SetMaximumError(1)
+    decimator.SetTargetReduction(decimate)
+
+    smoother = vtk.vtkWindowedSincPolyDataFilter()
+    smoother.SetInputConnection(decimator.GetOutputPort())
+    smoother.SetNumberOfIterations(smooth)
+    smoother.BoundarySmoothingOff()
+    smoother.FeatureEdgeSmoothingOff()
+    smoother.SetFeatureAngle(60)
+    smoother.SetPassBand(0.1)
+    smoother.NonManifoldSmoothingOn()
+    smoother.NormalizeCoordinatesOn()
+
+    transform = vtk.vtkTransform()
+    transform.SetMatrix(ijkToRas)
+    transformFilter = vtk.vtkTransformPolyDataFilter()
+    transformFilter.SetInputConnection(smoother.GetOutputPort())
+    transformFilter.SetTransform(transform)
+
+    normals = vtk.vtkPolyDataNormals()
+    normals.SetInputConnection(transformFilter.GetOutputPort())
+    normals.SplittingOn()
+    normals.ComputePointNormalsOn()
+    normals.Update()
+    return normals.GetOutput()
+
+  def benchmarkSurfaceExtraction(self, volumeNodes=None, repeats=3):
+    """
+    Times the Grayscale Model Maker CLI against the in-process extraction on recorded reconstruction volumes.
+    Both run synchronously and without the convex hull step.
+    :param volumeNodes: list of scalar volume nodes, the current reconstruction volume if None
+    :param repeats: int, number of runs averaged per volume and method
+    :returns: list of dict, one row per volume with mean times in milliseconds and output point counts
+    """
+    parameterNode = self.getParameterNode()
+    if volumeNodes is None:
+      volumeNodes = [parameterNode.GetNodeReference(self.RECONSTRUCTION_VOLUME)]
+    threshold = float(parameterNode.GetParameter(self.AI_THRESHOLD))
+    results = []
+    for volumeNode in volumeNodes:
+      outputModel = slicer.mrmlScene.AddNewNodeByClass("vtkMRMLModelNode")
+      parameters = self.getGrayscaleModelMakerParameters(volumeNode, outputModel)
+      startTime = time.perf_counter()
+      for i in range(repeats):
+        cliNode = slicer.cli.runSync(slicer.modules.grayscalemodelmaker, None, parameters, update_display=False)
+        slicer.mrmlScene.RemoveNode(cliNode)
+      cliTimeMs = (time.perf_counter() - startTime) * 1000.0 / repeats
+      cliPoints = outputModel.GetPolyData().GetNumberOfPoints() if outputModel.GetPolyData() else 0
+      slicer.mrmlScene.RemoveNode(outputModel)
+
+      ijkToRas = vtk.vtkMatrix4x4()
+      volumeNode.GetIJKToRASMatrix(ijkToRas)
+      discrete = volumeNode.IsA("vtkMRMLLabelMapVolumeNode")
+      startTime = time.perf_counter()
+      for i in range(repeats):
+        surface = self.extractSurfaceFromImage(volumeNode.GetImageData(), ijkToRas, threshold,
+                                               self.DEFAULT_SMOOTH, self.DEFAULT_DECIMATE, discrete)
+      inProcessTimeMs = (time.perf_counter() - startTime) * 1000.0 / repeats
+
+      result = {
+        "volume": volumeNode.GetName(),
+        "cliMs": cliTimeMs,
+        "inProcessMs": inProcessTimeMs,
+        "cliPoints": cliPoints,
+        "inProcessPoints": surface.GetNumberOfPoints(),
+      }
+      logging.info("Surface extraction of {volume}: CLI {cliMs:.0f} ms ({cliPoints} points), "
+                   "in-process {inProcessMs:.0f} ms ({inProcessPoints} points)".format(**result))
+      results.append(result)
+    return results
+
+  def benchmarkConvexHull(self, pointCounts=(1000, 5000, 20000, 80000), voxelSize=1.0, seed=0):
+    """
+    Times the previous vtkDelaunay3D convex hull against the Qhull one on noisy ellipsoid surface points,
+    similar to AI tumor surfaces.
+    :param pointCounts: list of int, number of surface points per run
+    :param voxelSize: float, voxel size (mm) for the run with voxel decimated points
+    :returns: list of dict, one row per point count with times in milliseconds and output triangle counts
+    """
+    randomState = np.random.RandomState(seed)
+    results = []
+    for pointCount in pointCounts:
+      directions = randomState.normal(size=(pointCount, 3))
+      directions /= np.linalg.norm(directions, axis=1)[:, np.newaxis]
+      points = directions * np.array([15.0, 10.0, 8.0]) + randomState.normal(scale=0.3, size=(pointCount, 3))
+      inputPolyData = polyDataFromPoints(points)
+
+      startTime = time.perf_counter()
+      delaunay = vtk.vtkDelaunay3D()
+      delaunay.SetInputData(inputPolyData)
+      outerSurface = vtk.vtkGeometryFilter()
+      outerSurface.SetInputConnection(delaunay.GetOutputPort())
+      outerSurface.Update()
+      delaunayTimeMs = (time.perf_counter() - startTime) * 1000.0
+
+      startTime = time.perf_counter()
+      qhullSurface = convexHullPolyData(points)
+      qhullTimeMs = (time.perf_counter() - startTime) * 1000.0
+
+      startTime = time.perf_counter()
+      decimatedSurface = convexHullPolyData(points, voxelSize)
+      decimatedTimeMs = (time.perf_counter() - startTime) * 1000.0
+
+      result = {
+        "points": pointCount,
+        "delaunayMs": delaunayTimeMs,
+        "qhullMs": qhullTimeMs,
+        "decimatedQhullMs": decimatedTimeMs,
+        "delaunayTriangles": outerSurface.GetOutput().GetNumberOfCells(),
+        "qhullTriangles": qhullSurface.GetNumberOfCells(),
+        "decimatedQhullTriangles": decimatedSurface.GetNumberOfCells(),
+      }
+      logging.info("Convex hull of {points} points: vtkDelaunay3D {delaunayMs:.1f} ms ({delaunayTriangles} triangles), "
+                   "Qhull {qhullMs:.1f} ms ({qhullTriangles} triangles), "
+                   "voxel decimated Qhull {decimatedQhullMs:.1f} ms ({decimatedQhullTriangles} triangles)".format(**result))
+      results.append(result)
+    return results
+
+  def benchmarkCompounding(self, numberOfFrames=200, imageShape=(615, 525), pixelSpacing=0.1, seed=0):
+    """
+    Times frame insertion in each SparseBlockVolume mode on a simulated freehand sweep of random prediction frames.
+    :param imageShape: (rows, columns) of prediction frames
+    :param pixelSpacing: float, pixel size in mm
+    :returns: list of dict, SparseBlockVolume statistics for each mode
+    """
+    randomState = np.random.RandomState(seed)
+    rows, columns = imageShape
+    frames = (randomState.rand(8, 1, rows, columns) * 255).astype(np.uint8)
+    frameMatrices = []
+    for frameIndex in range(numberOfFrames):
+      # Sweep along the needle y axis with some probe tilt, the image plane spanning x and z
+      angle = 0.2 * np.sin(frameIndex / 20.0)
+      ijkToNeedle = np.eye(4)
+      ijkToNeedle[:3, 0] = [pixelSpacing * np.cos(angle), pixelSpacing * np.sin(angle), 0.0]
+      ijkToNeedle[:3, 1] = [0.0, 0.0, pixelSpacing]
+      ijkToNeedle[:3, 3] = [-columns * pixelSpacing / 2, frameIndex * 0.25, -rows * pixelSpacing / 2]
+      frameMatrices.append(ijkToNeedle)
+
+    results = []
+    for mode in SparseBlockVolume.MODES:
+      compoundingVolume = SparseBlockVolume(self.COMPOUNDING_SPACING_MM, self.COMPOUNDING_BLOCK_SIZE, mode,
+                                            self.COMPOUNDING_MAXIMUM_SIZE_MM)
+      for frameIndex, ijkToNeedle in enumerate(frameMatrices):
+        compoundingVolume.insertFrame(frames[frameIndex % len(frames)], ijkToNeedle)
+      result = compoundingVolume.getStatistics()
+      logging.info("Compounding {frames} frames ({mode}): {framesPerSecond:.1f} frames/s, {megapixelsPerSecond:.1f} Mpixel/s, "
+                   "{blocks} blocks of {memoryMB:.1f} MB, {denseMemoryMB:.1f} MB as a dense volume".format(**result))
+      results.append(result)
+    return results
 
   def setDeleteLastFiducialClicked(self, numberOfPoints):
     deleted_coord = [0.0, 0.0, 0.0]
@@ -2616,78 +3777,121 @@ class LumpNav2Logic(ScriptedLoadableModuleLogic, VTKObservationMixin):
 
   def onTumorMarkupsNodeModified(self, observer, eventid):
     logging.debug("onTumorMarkupsNodeModified")
-    self.createTumorFromMarkups()
+    self.scheduleTumorRebuild()
     parameterNode = self.getParameterNode()
     parameterNode.Modified()
 
-  def createTumorFromMarkups(self):
-    logging.debug('createTumorFromMarkups')
-    # Create polydata point set from markup points
-    points = vtk.vtkPoints()
-    cellArray = vtk.vtkCellArray()
+  def getTumorMarkupsPoints(self):
     parameterNode = self.getParameterNode()
     tumorMarkups_Needle = parameterNode.GetNodeReference(self.TUMOR_MARKUPS_NEEDLE)
-    numberOfPoints = tumorMarkups_Needle.GetNumberOfControlPoints()
+    return arrayFromMarkupsNode(tumorMarkups_Needle)
 
-    # Surface generation algorithms behave unpredictably when there are not enough points
-    # return if there are very few points
-    if numberOfPoints < 1:
-      # sphereSource = vtk.vtkSphereSource()
-      # # sphereSource.SetRadius(0.001)
-      # tumorModel_Needle = parameterNode.GetNodeReference(self.TUMOR_MODEL)
-      # tumorModel_Needle.SetPolyDataConnection(sphereSource.GetOutputPort())
-      # tumorModel_Needle.Modified()
+  def scheduleTumorRebuild(self):
+    """
+    Requests a rebuild of the tumor model from the tumor markups.
+    Markup changes within TUMOR_REBUILD_DELAY_MS of each other are coalesced into one rebuild.
+    """
+    if self.tumorRebuildTimer is None:
+      self.tumorRebuildTimer = qt.QTimer()
+      self.tumorRebuildTimer.setSingleShot(True)
+      self.tumorRebuildTimer.setInterval(self.TUMOR_REBUILD_DELAY_MS)
+      self.tumorRebuildTimer.connect('timeout()', self.startTumorRebuild)
+    self.tumorRebuildTimer.start()
+
+  def startTumorRebuild(self):
+    """
+    Rebuilds the tumor model in a background thread from a snapshot of the current tumor markups.
+    If a rebuild is already running, one more rebuild is started from the latest points when it finishes,
+    so intermediate point sets are never computed.
+    """
+    if self.tumorRebuildThread is not None and self.tumorRebuildThread.is_alive():
+      self.tumorRebuildPending = True
       return
+    self.tumorRebuildPending = False
+    points = self.getTumorMarkupsPoints()
+    builder = self.tumorHullBuilder
+    self.tumorRebuildResult = None
 
-    points.SetNumberOfPoints(numberOfPoints)
-    new_coord = [0.0, 0.0, 0.0]
-    for i in range(numberOfPoints):
-      tumorMarkups_Needle.GetNthControlPointPosition(i, new_coord)
-      points.SetPoint(i, new_coord)
-
-    tumorMarkups_Needle.GetNthControlPointPosition(numberOfPoints - 1, new_coord)
-    logging.info("Placed point at position: %s", new_coord)
-
-    cellArray.InsertNextCell(numberOfPoints)
-    for i in range(numberOfPoints):
-      cellArray.InsertCellPoint(i)
-    pointPolyData = vtk.vtkPolyData()
-    pointPolyData.SetLines(cellArray)
-    pointPolyData.SetPoints(points)
-
-    delaunay = vtk.vtkDelaunay3D()
-
-    logging.debug("use glyphs")
-    sphere = vtk.vtkCubeSource()
-    glyph = vtk.vtkGlyph3D()
-    glyph.SetInputData(pointPolyData)
-    glyph.SetSourceConnection(sphere.GetOutputPort())
-    delaunay.SetInputConnection(glyph.GetOutputPort())
-
-    delaunay.Update()
-    surfaceFilter = vtk.vtkDataSetSurfaceFilter()
-    surfaceFilter.SetInputConnection(delaunay.GetOutputPort())
-
-    smoother = vtk.vtkButterflySubdivisionFilter()
-    smoother.SetInputConnection(surfaceFilter.GetOutputPort())
-    smoother.SetNumberOfSubdivisions(3)
-    smoother.Update()
+    def rebuild():
+      try:
+        changed = builder.update(points)
+        self.tumorRebuildResult = (builder, changed, builder.surfacePolyData)
+      except Exception as e:
+        logging.error(f"Tumor model rebuild failed: {e}")
 
-    delaunaySmooth = vtk.vtkDelaunay3D()
-    delaunaySmooth.SetInputData(smoother.GetOutput())
-    delaunaySmooth.Update()
+    self.tumorRebuildThread = threading.Thread(target=rebuild, name="TumorModelRebuild", daemon=True)
+    self.tumorRebuildThread.start()
 
-    smoothSurfaceFilter = vtk.vtkDataSetSurfaceFilter()
-    smoothSurfaceFilter.SetInputConnection(delaunaySmooth.GetOutputPort())
+    if self.tumorRebuildPollTimer is None:
+      self.tumorRebuildPollTimer = qt.QTimer()
+      self.tumorRebuildPollTimer.setInterval(self.TUMOR_REBUILD_POLL_MS)
+      self.tumorRebuildPollTimer.connect('timeout()', self.onTumorRebuildPollTimer)
+    self.tumorRebuildPollTimer.start()
 
-    normals = vtk.vtkPolyDataNormals()
-    normals.SetInputConnection(smoothSurfaceFilter.GetOutputPort())
-    normals.SetFeatureAngle(100.0)
-
-    normals.Update()
-    parameterNode = self.getParameterNode()
-    tumorModel_Needle = parameterNode.GetNodeReference(self.TUMOR_MODEL)
-    tumorModel_Needle.SetAndObservePolyData(normals.GetOutput())
+  def onTumorRebuildPollTimer(self):
+    """
+    Swaps the rebuilt surface into the tumor model on the main thread when the background rebuild is finished.
+    """
+    if self.tumorRebuildThread is not None and self.tumorRebuildThread.is_alive():
+      return
+    self.tumorRebuildPollTimer.stop()
+    result = self.tumorRebuildResult
+    self.tumorRebuildResult = None
+    if result is not None:
+      builder, changed, surfacePolyData = result
+      # Results of a builder replaced by a scene reset are discarded
+      if changed and surfacePolyData is not None and builder is self.tumorHullBuilder:
+        tumorModel_Needle = self.getParameterNode().GetNodeReference(self.TUMOR_MODEL)
+        tumorModel_Needle.SetAndObservePolyData(surfacePolyData)
+    if self.tumorRebuildPending:
+      self.startTumorRebuild()
+
+  def benchmarkTumorReconstruction(self, pointCounts=(10, 50, 100, 250, 500), seed=0):
+    """
+    Compares the incremental tumor hull with the original full rebuild pipeline.
+    Contour points are added one at a time on a noisy ellipsoid, like points marked on the tumor boundary.
+    :param pointCounts: numbers of contour points at which the two pipelines are compared
+    :param seed: int, random seed for the simulated contour points
+    :returns: list of dict, one row of timings in milliseconds per point count
+    """
+    rng = np.random.default_rng(seed)
+    directions = rng.normal(size=(max(pointCounts), 3))
+    directions /= np.linalg.norm(directions, axis=1)[:, np.newaxis]
+    contourPoints = directions * [20.0, 15.0, 10.0] * rng.uniform(0.8, 1.0, size=(len(directions), 1))
+
+    builder = TumorHullBuilder()
+    results = []
+    previousPointCount = 0
+    for pointCount in sorted(pointCounts):
+      startTime = time.perf_counter()
+      for numberOfAddedPoints in range(previousPointCount + 1, pointCount + 1):
+        builder.update(contourPoints[:numberOfAddedPoints])
+      addTimeMs = (time.perf_counter() - startTime) * 1000.0 / max(1, pointCount - previousPointCount)
+      previousPointCount = pointCount
+
+      removeIndex = int(rng.integers(pointCount))
+      startTime = time.perf_counter()
+      builder.update(np.delete(contourPoints[:pointCount], removeIndex, axis=0))
+      removeTimeMs = (time.perf_counter() - startTime) * 1000.0
+      builder.update(contourPoints[:pointCount])
+
+      startTime = time.perf_counter()
+      TumorHullBuilder.buildReferenceSurface(contourPoints[:pointCount])
+      referenceTimeMs = (time.perf_counter() - startTime) * 1000.0
+
+      result = {
+        "points": pointCount,
+        "referenceMs": referenceTimeMs,
+        "addMs": addTimeMs,
+        "removeMs": removeTimeMs,
+        "hullPoints": len(builder.hullPointIndices),
+      }
+      logging.info("Tumor reconstruction with {points} points: reference {referenceMs:.1f} ms, incremental add {addMs:.2f} ms, "
+                   "remove {removeMs:.2f} ms, {hullPoints} hull points".format(**result))
+      results.append(result)
+    logging.info(f"Incremental tumor hull updates: {builder.numberOfIncrementalUpdates} incremental, "
+                 f"{builder.numberOfSkippedUpdates} skipped, {builder.numberOfFullRebuilds} full rebuilds")
+    return results
 
   def setMarkPoints(self, toggled):
     parameterNode = self.getParameterNode()
@@ -2730,22 +3934,20 @@ class LumpNav2Logic(ScriptedLoadableModuleLogic, VTKObservationMixin):
       tumorMarkups_Needle.RemoveNthControlPoint(closestPoint)
       tumorMarkups_Needle.RemoveNthControlPoint(tumorMarkups_Needle.GetNumberOfControlPoints() - 1)
       logging.info("Used eraser to remove point at %s", closestPointPosition)
-      self.createTumorFromMarkups()
+      self.scheduleTumorRebuild()
 
   def returnClosestPoint(self, fiducialNode, erasePoint):
-    # Returns closest marked point to where eraser fiducial was placed
-    closestIndex = 0
-    distanceToClosest = np.inf
-    fiducialPosition = [0.0, 0.0, 0.0]
-    numberOfPoints = fiducialNode.GetNumberOfControlPoints()
-    for fiducialIndex in range(numberOfPoints - 1):
-      fiducialNode.GetNthControlPointPosition(fiducialIndex, fiducialPosition)
-      distanceToPoint = self.calculateDistance(fiducialPosition, erasePoint)
-      if distanceToPoint < distanceToClosest:
-        closestIndex = fiducialIndex
-        distanceToClosest = distanceToPoint
-    fiducialNode.GetNthControlPointPosition(closestIndex, fiducialPosition)
-    return closestIndex, fiducialPosition
+    # Returns closest marked point to where eraser fiducial was placed, the eraser fiducial itself is the last point
+    pointIndex = self.tumorPointIndex
+    if pointIndex.markupsNode is not fiducialNode:
+      pointIndex = MarkupsPointIndex()
+      pointIndex.setPoints(arrayFromMarkupsNode(fiducialNode, copy=False))
+    numberOfPoints = len(pointIndex.getPoints())
+    closestIndex, closestPosition = pointIndex.findClosestPoint(erasePoint, excludeIndices=(numberOfPoints - 1,))
+    if closestIndex < 0:
+      closestIndex = 0
+      closestPosition = pointIndex.points[0] if numberOfPoints > 0 else np.zeros(3)
+    return closestIndex, list(closestPosition)
 
   def setPlaceHydromark(self, toggled):
     parameterNode = self.getParameterNode()
@@ -2868,20 +4070,12 @@ class LumpNav2Logic(ScriptedLoadableModuleLogic, VTKObservationMixin):
   def onBreachWarningNodeChanged(self, observer, eventid):
     parameterNode = self.getParameterNode()
     breachWarningNode = parameterNode.GetNodeReference(self.BREACH_WARNING)
-    if breachWarningNode.GetClosestDistanceToModelFromToolTip() < 0:
-      # Display breach warning text in corner of view
-      for i in range(slicer.app.layoutManager().threeDViewCount):
-        view = slicer.app.layoutManager().threeDWidget(i).threeDView()
-        view.cornerAnnotation().SetText(vtk.vtkCornerAnnotation.LowerLeft, "BREACH!")
-        textProperty = view.cornerAnnotation().GetTextProperty()
-        textProperty.SetColor(1, 0, 0)
-        view.forceRender()
-
-      # Add breach event to event table
-      if parameterNode.GetParameter(self.BREACH_STATUS) == "False":
-        self.addEvent(description="Tumor margin breach")
-        parameterNode.SetParameter(self.BREACH_STATUS, "True")
+    isBreach = breachWarningNode.GetClosestDistanceToModelFromToolTip() < 0
+    # Views and the event table are only touched when the breach state changes, not on every tracking update
+    if isBreach != self.breachState:
+      self.setBreachState(isBreach)
 
+    if isBreach:
       # Get coordinate of cautery tip in needle coordinate system
       needleToReference = parameterNode.GetNodeReference(self.NEEDLE_TO_REFERENCE)
       cauteryTipToNeedle = vtk.vtkMatrix4x4()
@@ -2890,31 +4084,125 @@ class LumpNav2Logic(ScriptedLoadableModuleLogic, VTKObservationMixin):
       cauteryTip_needleTip = cauteryTipToNeedle.MultiplyFloatPoint([0, 0, 0, 1])
 
       # Check if another fiducial already exists within threshold distance from cautery tip
-      breachMarkupsProximityThreshold = slicer.util.settingsValue(self.BREACH_MARKUPS_PROXIMITY_THRESHOLD, 1, converter=lambda x: int(x))
+      breachMarkupsProximityThreshold = self.getBreachMarkupsProximityThreshold()
       breachMarkups_Needle = parameterNode.GetNodeReference(self.BREACH_MARKUPS_NEEDLE)
       if not self.hasFiducialWithinDistance(breachMarkups_Needle, cauteryTip_needleTip[0:3], breachMarkupsProximityThreshold):
         breachMarkups_Needle.AddControlPoint(cauteryTip_needleTip[0], cauteryTip_needleTip[1], cauteryTip_needleTip[2], "")
+        self.breachPointIndex.addPoint(cauteryTip_needleTip[0:3])
         logging.info(f"Added breach warning fiducial at position {cauteryTip_needleTip[0:3]}")
 
-    else:
-      # Remove corner annotation
-      for i in range(slicer.app.layoutManager().threeDViewCount):
-        view = slicer.app.layoutManager().threeDWidget(i).threeDView()
-        view.cornerAnnotation().SetText(vtk.vtkCornerAnnotation.LowerLeft, "")
-        textProperty = view.cornerAnnotation().GetTextProperty()
+  def setBreachState(self, isBreach):
+    """
+    Shows or hides the breach warning in the 3D views and records the start of a breach in the event table.
+    """
+    self.breachState = isBreach
+    for i in range(slicer.app.layoutManager().threeDViewCount):
+      view = slicer.app.layoutManager().threeDWidget(i).threeDView()
+      view.cornerAnnotation().SetText(vtk.vtkCornerAnnotation.LowerLeft, "BREACH!" if isBreach else "")
+      textProperty = view.cornerAnnotation().GetTextProperty()
+      if isBreach:
+        textProperty.SetColor(1, 0, 0)
+      else:
         textProperty.SetColor(1, 1, 1)
-        view.forceRender()
+    self.scheduleThreeDViewsRender()
+
+    parameterNode = self.getParameterNode()
+    if isBreach:
+      # Add breach event to event table
+      if parameterNode.GetParameter(self.BREACH_STATUS) == "False":
+        self.addEvent(description="Tumor margin breach")
+        parameterNode.SetParameter(self.BREACH_STATUS, "True")
+    else:
       parameterNode.SetParameter(self.BREACH_STATUS, "False")
 
+  def scheduleThreeDViewsRender(self):
+    """
+    Requests a render of all 3D views. Requests within THREE_D_VIEWS_RENDER_INTERVAL_MS are merged into one.
+    """
+    if self.threeDViewsRenderTimer is None:
+      self.threeDViewsRenderTimer = qt.QTimer()
+      self.threeDViewsRenderTimer.setSingleShot(True)
+      self.threeDViewsRenderTimer.setInterval(self.THREE_D_VIEWS_RENDER_INTERVAL_MS)
+      self.threeDViewsRenderTimer.connect('timeout()', self.renderThreeDViews)
+    if not self.threeDViewsRenderTimer.isActive():
+      self.threeDViewsRenderTimer.start()
+
+  def renderThreeDViews(self):
+    for i in range(slicer.app.layoutManager().threeDViewCount):
+      slicer.app.layoutManager().threeDWidget(i).threeDView().scheduleRender()
+
+  def getBreachMarkupsProximityThreshold(self):
+    # Read from settings once, then kept current by setBreachMarkupsProximityThreshold
+    if self.breachMarkupsProximityThreshold is None:
+      self.breachMarkupsProximityThreshold = slicer.util.settingsValue(self.BREACH_MARKUPS_PROXIMITY_THRESHOLD, 1, converter=lambda x: int(x))
+    return self.breachMarkupsProximityThreshold
+
+  def setBreachMarkupsProximityThreshold(self, value):
+    settings = qt.QSettings()
+    settings.setValue(self.BREACH_MARKUPS_PROXIMITY_THRESHOLD, value)
+    self.breachMarkupsProximityThreshold = int(value)
+
   def hasFiducialWithinDistance(self, markupsNode, point, threshold):
+    # Breach markups are locked and only added here, so the grid is rebuilt only when the point count or threshold changes
+    cellSize = threshold if threshold > 0 else 1.0
     numberOfPoints = markupsNode.GetNumberOfControlPoints()
-    for fiducialIndex in range(numberOfPoints):
-      fiducialPosition = markupsNode.GetNthControlPointPosition(fiducialIndex)
-      distance = self.calculateDistance(point, fiducialPosition)
-      if distance <= threshold:
-        return True
-    else:
-      return False
+    if self.breachPointIndex.numberOfPoints != numberOfPoints or self.breachPointIndex.cellSize != cellSize:
+      self.breachPointIndex.setPoints(arrayFromMarkupsNode(markupsNode, copy=False), cellSize)
+    return self.breachPointIndex.hasPointWithinDistance(point, threshold)
+
+  def benchmarkBreachProximity(self, durationMinutes=30, frameRate=20, threshold=1.0, tumorRadius=15.0, seed=0):
+    """
+    Simulates the cautery tip moving around a tumor during an excision, and times the "already marked nearby"
+    check of the grid index against the original loop over all breach points.
+    The original loop is only timed on every 100th breach frame, because it gets slow as breaches accumulate.
+    :returns: dict with the number of frames, breach frames and breach points, and mean query times in microseconds
+    """
+    rng = np.random.default_rng(seed)
+    numberOfFrames = int(durationMinutes * 60 * frameRate)
+    direction = np.array([1.0, 0.0, 0.0])
+    radialOffset = 0.0
+    breachPoints = []
+    gridIndex = PointGridIndex(threshold)
+    numberOfBreachFrames = 0
+    gridTime = 0.0
+    referenceTime = 0.0
+    numberOfReferenceQueries = 0
+    for frame in range(numberOfFrames):
+      # Tip wanders over the tumor surface and in and out of it by a few millimeters
+      direction += rng.normal(scale=0.01, size=3)
+      direction /= np.linalg.norm(direction)
+      radialOffset = 0.98 * radialOffset + rng.normal(scale=0.3)
+      if radialOffset >= 0:
+        continue
+      numberOfBreachFrames += 1
+      tip = direction * (tumorRadius + radialOffset)
+
+      startTime = time.perf_counter()
+      isMarked = gridIndex.hasPointWithinDistance(tip, threshold)
+      gridTime += time.perf_counter() - startTime
+
+      if numberOfBreachFrames % 100 == 0:
+        startTime = time.perf_counter()
+        isMarkedReference = any(self.calculateDistance(tip, breachPoint) <= threshold for breachPoint in breachPoints)
+        referenceTime += time.perf_counter() - startTime
+        numberOfReferenceQueries += 1
+        if isMarkedReference != isMarked:
+          logging.warning("Breach proximity check differs from the reference at frame {}".format(frame))
+
+      if not isMarked:
+        breachPoints.append(tip)
+        gridIndex.addPoint(tip)
+
+    result = {
+      "frames": numberOfFrames,
+      "breachFrames": numberOfBreachFrames,
+      "breachPoints": len(breachPoints),
+      "gridQueryUs": gridTime * 1e6 / max(1, numberOfBreachFrames),
+      "referenceQueryUs": referenceTime * 1e6 / max(1, numberOfReferenceQueries),
+    }
+    logging.info("Breach proximity over {frames} frames ({breachFrames} breaching, {breachPoints} breach points): "
+                 "grid {gridQueryUs:.1f} us, reference {referenceQueryUs:.1f} us per query".format(**result))
+    return result
 
   def setBreachFiducialSize(self, value):
     parameterNode = self.getParameterNode()
@@ -2951,11 +4239,51 @@ class LumpNav2Logic(ScriptedLoadableModuleLogic, VTKObservationMixin):
       predictionData.SetDimensions(imageDimensions)
 
   def setDisplayCauteryStateClicked(self, pressed):
-    import CauteryClassification
-    cauteryClassificationLogic = CauteryClassification.CauteryClassificationLogic()
-    #cauteryClassificationLogic.init()
-    cauteryClassificationLogic.setup()
-    cauteryClassificationLogic.setUseModelClicked(pressed)
+    # Classification logic is created once and keeps its models and scope buffer between toggles
+    if self.cauteryClassificationLogic is None:
+      import CauteryClassification
+      self.cauteryClassificationLogic = CauteryClassification.CauteryClassificationLogic()
+      self.cauteryClassificationLogic.setup()
+    self.cauteryClassificationLogic.setUseModelClicked(pressed)
+
+    # The state text node is only modified when the debounced cautery state changes
+    if self.cauteryStateTextNode is not None:
+      self.removeObserver(self.cauteryStateTextNode, vtk.vtkCommand.ModifiedEvent, self.onCauteryStateModified)
+      self.cauteryStateTextNode = None
+    if pressed:
+      self.cauteryStateTextNode = self.cauteryClassificationLogic.getCauteryStateTextNode()
+      self.addObserver(self.cauteryStateTextNode, vtk.vtkCommand.ModifiedEvent, self.onCauteryStateModified)
+    self.onCauteryStateModified()
+
+  def onCauteryStateModified(self, caller=None, event=None):
+    cauteryState = ""
+    if self.cauteryStateTextNode is not None:
+      cauteryState = self.cauteryStateTextNode.GetText() or ""
+    for i in range(slicer.app.layoutManager().threeDViewCount):
+      view = slicer.app.layoutManager().threeDWidget(i).threeDView()
+      self.getCauteryStateTextActor(view).SetInput(cauteryState)
+    self.scheduleThreeDViewsRender()
+
+  def getCauteryStateTextActor(self, view):
+    """
+    Returns the text actor showing the cautery state in the upper left corner of a 3D view. It is separate from the
+    view's corner annotation, so the breach warning color does not change the cautery state color.
+    """
+    textActor = self.cauteryStateTextActors.get(view.mrmlViewNode().GetID())
+    if textActor is None:
+      textActor = vtk.vtkTextActor()
+      textProperty = textActor.GetTextProperty()
+      textProperty.SetColor(1, 1, 1)
+      textProperty.SetFontSize(24)
+      textProperty.SetJustificationToLeft()
+      textProperty.SetVerticalJustificationToTop()
+      textActor.GetPositionCoordinate().SetCoordinateSystemToNormalizedViewport()
+      textActor.SetPosition(0.01, 0.99)
+      self.cauteryStateTextActors[view.mrmlViewNode().GetID()] = textActor
+    renderer = view.renderWindow().GetRenderers().GetFirstRenderer()
+    if not renderer.HasViewProp(textActor):
+      renderer.AddActor2D(textActor)
+    return textActor
 
   def addEvent(self, description=None):
     parameterNode = self.getParameterNode()
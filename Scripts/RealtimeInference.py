@@ -1,12 +1,25 @@
 """
 Implements an OpenIGTLink client that expect pyigtl.ImageMessage and returns pyigtl.ImageMessage with YOLOv5 inference added to the image.
 Arguments:
-    model: string path to the torchscript file you intend to use
-    input device name: This is the device name the client is listening to
-    output device name: The device name the client outputs to
+    model: string path to the torchscript (or .onnx) file you intend to use
+    backend: torchscript or onnxruntime. TorchScript models are exported to ONNX on first use with onnxruntime.
+    device: auto, cpu or cuda
+    intra/inter op threads: number of threads used within and across operators (0 keeps the library default)
+    quantize: apply dynamic int8 quantisation (onnxruntime backend)
+    roi: fixed region of interest (x y width height) that is cropped from every frame before inference
+    auto roi frames: detect the region of interest from the nonzero pixels of the first frames of each device
+    motion threshold/translation/rotation: skip inference and re-send the last prediction while the image or its
+        ImageToReference transform changed less than these thresholds since the last inferred frame
+    mask smoothing: weight of the previous mask in exponential smoothing of predictions
+    compare backends: print an A/B timing report of all available backends and exit
+    input device name: This is the device name the client is listening to. Several names can be given to run
+        the model on frames of multiple devices in one batch.
+    output device name: The device name the client outputs to, or one name per input device
+    batch window: time in ms to wait for frames of the other input devices before running a batch
     host: the server's IP the client connects to.
     input port: port used for receiving data from the PLUS server over OpenIGTLink
     output port: port used for sending data to Slicer over OpenIGTLink
+    output head: foreground (default) computes only the foreground probability on the device, softmax computes all classes
     target size: target quadratic size the model resizes to internally for predictions. Does not affect the actual output size
     confidence threshold: only bounding boxes above the given threshold will be visualized.
     line thickness: line thickness of drawn bounding boxes. Also affects font size of class names and confidence
@@ -16,6 +29,10 @@ import argparse
 import traceback
 import sys
 import json
+import time
+import queue
+import threading
+import tracemalloc
 import numpy as np
 import cv2
 from pathlib import Path
@@ -24,16 +41,46 @@ import torch
 
 
 ROOT = Path(__file__).parent.resolve()
+BACKENDS = ["torchscript", "onnxruntime"]
 
 # Parse command line arguments
 def parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument("--model", type=str)
-    parser.add_argument("--input-device-name", type=str, default="Image_Image")
-    parser.add_argument("--output-device-name", type=str, default="Prediction")
+    parser.add_argument("--backend", type=str, choices=BACKENDS, default="torchscript")
+    parser.add_argument("--device", type=str, choices=["auto", "cpu", "cuda"], default="auto")
+    parser.add_argument("--intra-op-threads", type=int, default=0)
+    parser.add_argument("--inter-op-threads", type=int, default=0)
+    parser.add_argument("--quantize", action="store_true")
+    parser.add_argument("--compare-backends", action="store_true")
+    parser.add_argument("--input-device-name", type=str, nargs="+", default=["Image_Image"])
+    parser.add_argument("--output-device-name", type=str, nargs="+", default=["Prediction"])
     parser.add_argument("--host", type=str, default="127.0.0.1")
     parser.add_argument("--input-port", type=int, default=18944)
     parser.add_argument("--output-port", type=int, default=18945)
+    parser.add_argument("--queue-size", type=int, default=1)
+    parser.add_argument("--stats-interval", type=float, default=5.0)
+    parser.add_argument("--batch-window", type=float, default=0.0,
+                        help="Time in ms to collect frames from all input devices into one batch")
+    parser.add_argument("--warmup-iterations", type=int, default=10)
+    parser.add_argument("--profile-iterations", type=int, default=20)
+    parser.add_argument("--roi", type=int, nargs=4, metavar=("X", "Y", "WIDTH", "HEIGHT"))
+    parser.add_argument("--auto-roi-frames", type=int, default=0,
+                        help="Number of first frames used to detect the region of interest, 0 disables detection")
+    parser.add_argument("--roi-margin", type=int, default=4)
+    parser.add_argument("--motion-threshold", type=float, default=0.0,
+                        help="Mean absolute gray level change below which inference is skipped, 0 disables")
+    parser.add_argument("--motion-translation", type=float, default=0.0,
+                        help="Image transform translation in mm below which inference is skipped, 0 disables")
+    parser.add_argument("--motion-rotation", type=float, default=0.0,
+                        help="Image transform rotation in degrees below which inference is skipped, 0 disables")
+    parser.add_argument("--max-skipped-frames", type=int, default=10)
+    parser.add_argument("--mask-smoothing", type=float, default=0.0,
+                        help="Weight of the previous mask in exponential smoothing of predictions, 0 disables")
+    parser.add_argument("--output-head", type=str, choices=["foreground", "softmax"], default="foreground",
+                        help="foreground computes only the foreground probability on the device, softmax computes all classes")
+    parser.add_argument("--benchmark-processing", type=int, nargs=2, metavar=("HEIGHT", "WIDTH"),
+                        help="Compare per-frame allocations of pre/post-processing for images of the given size and exit")
     try:
         return parser.parse_args()
     except SystemExit as err:
@@ -41,47 +88,471 @@ def parse_args():
         sys.exit(err.code)
 
 
-# runs the client in an infinite loop, waiting for messages from the server. Once a message is received,
-# the message is processed and the inference is sent back to the server as a pyigtl ImageMessage.
-def run_client(args):
-    input_client = pyigtl.OpenIGTLinkClient(host=args.host, port=args.input_port)
-    output_server = pyigtl.OpenIGTLinkServer(port=args.output_port)
-    model = None
+# Bounded queue that drops the oldest item when full, so consumers always get the newest data.
+class LatestQueue:
+    def __init__(self, maxsize=1):
+        self._queue = queue.Queue(maxsize=max(1, maxsize))
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def put(self, item):
+        with self._lock:
+            while True:
+                try:
+                    self._queue.put_nowait(item)
+                    return
+                except queue.Full:
+                    try:
+                        self._queue.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
+
+    def get(self, timeout=None):
+        return self._queue.get(timeout=timeout)
+
+    def get_nowait(self):
+        return self._queue.get_nowait()
+
+    @property
+    def maxsize(self):
+        return self._queue.maxsize
+
+    def qsize(self):
+        return self._queue.qsize()
+
+
+# Collects per-stage latencies (in seconds) and prints a summary every interval.
+class PipelineStats:
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._latencies = {}
+        self._counters = {}
+        self._last_report = time.perf_counter()
+
+    def add_latency(self, stage, seconds):
+        with self._lock:
+            self._latencies.setdefault(stage, []).append(seconds)
+
+    def increment(self, counter, amount=1):
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + amount
+
+    def report(self, queues):
+        now = time.perf_counter()
+        if self.interval <= 0 or now - self._last_report < self.interval:
+            return
+        with self._lock:
+            latencies, self._latencies = self._latencies, {}
+            counters = dict(self._counters)
+            elapsed = now - self._last_report
+            self._last_report = now
+        parts = []
+        for stage, values in latencies.items():
+            values = np.asarray(values) * 1000
+            parts.append(f"{stage}: mean {values.mean():.1f} ms, max {values.max():.1f} ms")
+        for name, q in queues.items():
+            parts.append(f"{name} queue: depth {q.qsize()}, dropped {q.dropped}")
+        for name, value in counters.items():
+            parts.append(f"{name}: {value}")
+        frames = len(latencies.get("end to end", []))
+        print(f"[{frames / elapsed:.1f} FPS] " + " | ".join(parts))
 
-    while True:
+
+# Maps every input image device to the device name its prediction is sent under. With a single input
+# device the output device name is used as is. With several input devices, output names are either
+# given one per input device or derived by replacing "Image" with "Prediction" in the input name.
+def get_output_device_names(args):
+    input_names = args.input_device_name
+    output_names = args.output_device_name
+    if len(output_names) == len(input_names):
+        return dict(zip(input_names, output_names))
+    if len(input_names) == 1:
+        return {input_names[0]: output_names[0]}
+    return {name: name.replace("Image", "Prediction") for name in input_names}
+
+
+# Returns the input device an image transform belongs to, or None. The transform is matched to the input device
+# with the longest name prefix (the part before "_"), e.g. ImageToReference belongs to Image_Image.
+def get_transform_device_name(transform_name, input_device_names):
+    best_prefix = ""
+    best_device_name = None
+    for input_name in input_device_names:
+        prefix = input_name.split("_")[0]
+        if transform_name.startswith(prefix + "To") and len(prefix) > len(best_prefix):
+            best_prefix = prefix
+            best_device_name = input_name
+    return best_device_name
+
+
+# Returns the name an image transform is forwarded under, e.g. ImageToReference -> PredictionToReference,
+# so that each prediction is placed with the transform of its own image.
+def get_output_transform_name(transform_name, output_device_names):
+    input_name = get_transform_device_name(transform_name, output_device_names)
+    if input_name is None:
+        return transform_name.replace("Image", "Prediction")
+    prefix = input_name.split("_")[0]
+    return output_device_names[input_name].split("_")[0] + transform_name[len(prefix):]
+
+
+# Polls the PLUS server and pushes the newest image of every input device into its inference queue.
+# Image transforms do not need any processing, so they are forwarded straight to the send queue.
+# The latest transform of every input device is also kept in image_transforms for motion gating.
+def receive_loop(input_client, output_device_names, image_queues, send_queue, image_transforms, stop_event):
+    while not stop_event.is_set():
         messages = input_client.get_latest_messages()
+        if not messages:
+            time.sleep(0.001)
+            continue
         for message in messages:
-            if message.device_name == args.input_device_name:  # Image message
-                if model is None:
-                    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-                    # Load model
-                    model_path = args.model if Path(args.model).is_absolute() else f'{str(ROOT)}/{args.model}'
-                    extra_files = {"config.json": ""}
-                    model = torch.jit.load(model_path, _extra_files=extra_files).to(device)
-                    config = json.loads(extra_files["config.json"])
-                    input_size = config["shape"][-1]
-
-                # Resize image to model input size
-                orig_img_size = message.image.shape
-                image = preprocess_input(message.image, input_size).to(device)
-            
-                # Run inference
-                with torch.inference_mode():
-                    prediction = model(image)
-
-                if isinstance(prediction, list):
-                    prediction = prediction[0]
-                    
-                prediction = torch.nn.functional.softmax(prediction, dim=1)
-                prediction = postprocess_prediction(prediction, orig_img_size)
-
-                image_message = pyigtl.ImageMessage(prediction, device_name=args.output_device_name)
-                output_server.send_message(image_message, wait=True)
+            if message.device_name in image_queues:  # Image message
+                image_queues[message.device_name].put((time.perf_counter(), message))
 
             if message.message_type == "TRANSFORM" and "Image" in message.device_name:  # Image transform message
-                output_tfm_name = message.device_name.replace("Image", "Prediction")
-                tfm_message = pyigtl.TransformMessage(message.matrix, device_name=output_tfm_name)
-                output_server.send_message(tfm_message, wait=True)
+                output_tfm_name = get_output_transform_name(message.device_name, output_device_names)
+                tfm_message = pyigtl.TransformMessage(message.matrix, device_name=output_tfm_name,
+                                                     timestamp=message.timestamp)
+                send_queue.put((time.perf_counter(), tfm_message))
+                device_name = get_transform_device_name(message.device_name, image_queues)
+                if device_name is not None:
+                    image_transforms[device_name] = np.array(message.matrix)
+
+
+# Waits for the first frame on any input device, then keeps collecting frames until the batch window
+# expires or every device has delivered a frame. Frames queued on the same device are kept together,
+# which allows batching a frame with its temporal neighbours when --queue-size is larger than 1.
+def collect_batch(image_queues, batch_window, stop_event):
+    batch = []
+    deadline = None
+    while not stop_event.is_set():
+        for device_name, image_queue in image_queues.items():
+            while True:
+                try:
+                    received_time, message = image_queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append((received_time, device_name, message))
+        if batch and deadline is None:
+            deadline = time.perf_counter() + batch_window
+        if batch:
+            devices_in_batch = {device_name for _, device_name, _ in batch}
+            if len(devices_in_batch) == len(image_queues) or time.perf_counter() >= deadline:
+                return batch
+        time.sleep(0.0005)
+    return batch
+
+
+# Takes the newest frames from the queues, runs the model on them in one batch and queues each prediction
+# for sending under the output device name of its input device.
+def inference_loop(args, model, device, config, image_queues, send_queue, image_transforms, stats, stop_event):
+    # Output masks stay referenced by queued messages until they are sent, so keep enough of them in rotation
+    processor = FrameProcessor(config["shape"][-1], device, len(image_queues) * args.queue_size,
+                               send_queue.maxsize + 2)
+    output_device_names = get_output_device_names(args)
+    batch_window = args.batch_window / 1000.0
+    rois = {device_name: tuple(args.roi) if args.roi else None for device_name in image_queues}
+    roi_frame_sizes = {}
+    roi_detectors = {}
+    if not args.roi and args.auto_roi_frames > 0:
+        roi_detectors = {device_name: RoiDetector(args.auto_roi_frames, margin=args.roi_margin)
+                         for device_name in image_queues}
+    motion_gates = {}
+    if args.motion_threshold > 0 or args.motion_translation > 0 or args.motion_rotation > 0:
+        motion_gates = {device_name: MotionGate(args.motion_threshold, args.motion_translation,
+                                                args.motion_rotation, args.max_skipped_frames)
+                        for device_name in image_queues}
+    smoothed_predictions = {}
+    while not stop_event.is_set():
+        batch = collect_batch(image_queues, batch_window, stop_event)
+        if not batch:
+            continue
+        start_time = time.perf_counter()
+        for received_time, _, _ in batch:
+            stats.add_latency("queue wait", start_time - received_time)
+
+        for _, device_name, message in batch:
+            # A fixed region of interest is clamped to the frame size, which is only known once frames arrive
+            frame_size = message.image.shape[1:]
+            if args.roi and roi_frame_sizes.get(device_name) != frame_size:
+                roi_frame_sizes[device_name] = frame_size
+                rois[device_name] = clamp_roi(tuple(args.roi), frame_size[1], frame_size[0])
+                if rois[device_name] != tuple(args.roi):
+                    print(f"Clamped region of interest for {device_name} to the {frame_size[1]}x{frame_size[0]} "
+                          f"image: x, y, width, height = {rois[device_name]}")
+                    smoothed_predictions.pop(device_name, None)
+            detector = roi_detectors.get(device_name)
+            if detector is not None and detector.update(message.image):
+                rois[device_name] = detector.roi
+                del roi_detectors[device_name]
+                smoothed_predictions.pop(device_name, None)
+                print(f"Detected region of interest for {device_name}: x, y, width, height = {detector.roi}")
+
+        # Re-send the cached prediction for frames that barely moved since the last inferred frame
+        if motion_gates:
+            computed_batch = []
+            for received_time, device_name, message in batch:
+                gate = motion_gates[device_name]
+                if gate.should_skip(message.image, image_transforms.get(device_name)):
+                    image_message = pyigtl.ImageMessage(gate.cached_prediction,
+                                                        device_name=output_device_names[device_name],
+                                                        timestamp=message.timestamp)
+                    send_queue.put((received_time, image_message))
+                    stats.increment("skipped frames")
+                else:
+                    computed_batch.append((received_time, device_name, message))
+            batch = computed_batch
+            if not batch:
+                continue
+
+        # Crop the region of interest and resize images to model input size
+        images = processor.preprocess([message.image for _, _, message in batch],
+                                      [rois[device_name] for _, device_name, _ in batch])
+
+        # Run inference
+        with torch.inference_mode():
+            predictions = model(images)
+
+        with torch.inference_mode():
+            if args.output_head == "foreground":
+                predictions = foreground_probability(predictions)
+            else:
+                predictions = torch.nn.functional.softmax(predictions, dim=1)[:, 1]
+
+        for index, (received_time, device_name, message) in enumerate(batch):
+            prediction = predictions[index]
+            if args.mask_smoothing > 0:
+                previous = smoothed_predictions.get(device_name)
+                if previous is not None and previous.shape == prediction.shape:
+                    prediction = torch.lerp(prediction, previous, args.mask_smoothing)
+                smoothed_predictions[device_name] = prediction
+            # Output buffers are rotated per device, so a cached mask is not overwritten by other devices
+            prediction = processor.postprocess(prediction, message.image.shape, rois[device_name], device_name)
+            if motion_gates:
+                motion_gates[device_name].update(message.image, image_transforms.get(device_name), prediction)
+            # Keep the timestamp of the source image so predictions can be matched to their frame
+            image_message = pyigtl.ImageMessage(prediction, device_name=output_device_names[device_name],
+                                                timestamp=message.timestamp)
+            send_queue.put((received_time, image_message))
+        stats.add_latency("inference", time.perf_counter() - start_time)
+        stats.increment("batches")
+        stats.increment("computed frames", len(batch))
+
+
+# Computes only the foreground (class 1) probability from (N, classes, H, W) logits and returns (N, H, W).
+# For two classes softmax reduces to a sigmoid of the logit difference. For more classes only the
+# foreground channel of the softmax is evaluated.
+def foreground_probability(logits, foreground_index=1):
+    if logits.shape[1] == 2:
+        return torch.sigmoid(logits[:, foreground_index] - logits[:, 1 - foreground_index])
+    return torch.exp(logits[:, foreground_index] - torch.logsumexp(logits, dim=1))
+
+
+# Runs a TorchScript model. Thread counts are process wide in torch, so they are set before the model is loaded.
+class TorchScriptBackend:
+    name = "torchscript"
+
+    def __init__(self, model_path, device, intra_op_threads=0, inter_op_threads=0, quantize=False):
+        if intra_op_threads > 0:
+            torch.set_num_threads(intra_op_threads)
+        if inter_op_threads > 0:
+            try:
+                torch.set_num_interop_threads(inter_op_threads)
+            except RuntimeError:
+                print("Inter-op threads can only be set before torch starts parallel work, keeping the current value")
+        if quantize:
+            print("Dynamic quantisation is only supported by the onnxruntime backend, running the float model")
+        self.device = device
+        extra_files = {"config.json": ""}
+        self.model = torch.jit.load(model_path, _extra_files=extra_files).to(device)
+        self.model.eval()
+        self.config = json.loads(extra_files["config.json"])
+
+    def __call__(self, images):
+        predictions = self.model(images)
+        if isinstance(predictions, list):
+            predictions = predictions[0]
+        return predictions
+
+
+# Runs an ONNX model with ONNX Runtime. A TorchScript model is exported to ONNX next to the original file the
+# first time it is used, and the config.json is stored in the ONNX metadata. Inputs and outputs stay on the host.
+class OnnxRuntimeBackend:
+    name = "onnxruntime"
+
+    def __init__(self, model_path, device, intra_op_threads=0, inter_op_threads=0, quantize=False):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ImportError("The onnxruntime backend requires the onnxruntime package (pip install onnxruntime)")
+
+        model_path = Path(model_path)
+        if model_path.suffix != ".onnx":
+            model_path = export_onnx(model_path)
+        if quantize:
+            model_path = quantize_onnx(model_path)
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        if inter_op_threads > 1:
+            options.execution_mode = onnxruntime.ExecutionMode.ORT_PARALLEL
+        providers = ["CPUExecutionProvider"]
+        if device.type == "cuda":
+            providers.insert(0, "CUDAExecutionProvider")
+        self.session = onnxruntime.InferenceSession(str(model_path), options, providers=providers)
+        self.input_name = self.session.get_inputs()[0].name
+        self.config = json.loads(self.session.get_modelmeta().custom_metadata_map["config.json"])
+        self.device = torch.device("cpu")
+
+    def __call__(self, images):
+        predictions = self.session.run(None, {self.input_name: images.numpy()})
+        return torch.from_numpy(predictions[0])
+
+
+# Exports a TorchScript model to ONNX with a dynamic batch dimension. The export is reused while it is newer
+# than the TorchScript file.
+def export_onnx(model_path):
+    import onnx
+
+    onnx_path = model_path.with_suffix(".onnx")
+    if onnx_path.exists() and onnx_path.stat().st_mtime >= model_path.stat().st_mtime:
+        return onnx_path
+    extra_files = {"config.json": ""}
+    model = torch.jit.load(str(model_path), _extra_files=extra_files, map_location="cpu")
+    model.eval()
+    config = json.loads(extra_files["config.json"])
+    dummy_input = torch.zeros([1] + list(config["shape"][1:]), dtype=torch.float32)
+    torch.onnx.export(model, dummy_input, str(onnx_path), input_names=["input"], output_names=["output"],
+                      dynamic_axes={"input": {0: "batch"}, "output": {0: "batch"}}, opset_version=13)
+    onnx_model = onnx.load(str(onnx_path))
+    metadata = onnx_model.metadata_props.add()
+    metadata.key = "config.json"
+    metadata.value = extra_files["config.json"]
+    onnx.save(onnx_model, str(onnx_path))
+    print(f"Exported {model_path.name} to {onnx_path}")
+    return onnx_path
+
+
+# Applies dynamic int8 quantisation to the weights of an ONNX model. Metadata, including config.json, is kept.
+def quantize_onnx(onnx_path):
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    quantized_path = onnx_path.with_name(onnx_path.stem + "_int8.onnx")
+    if not quantized_path.exists() or quantized_path.stat().st_mtime < onnx_path.stat().st_mtime:
+        quantize_dynamic(str(onnx_path), str(quantized_path), weight_type=QuantType.QInt8)
+    return quantized_path
+
+
+def get_device(args):
+    if args.device == "auto":
+        return torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    return torch.device(args.device)
+
+
+# Loads the model with the selected backend. Returns the backend, the device its inputs go to and the config.
+def load_model(args, backend_name=None, quantize=None):
+    backend_name = backend_name or args.backend
+    quantize = args.quantize if quantize is None else quantize
+    model_path = args.model if Path(args.model).is_absolute() else f'{str(ROOT)}/{args.model}'
+    backend_class = TorchScriptBackend if backend_name == "torchscript" else OnnxRuntimeBackend
+    backend = backend_class(model_path, get_device(args), args.intra_op_threads, args.inter_op_threads, quantize)
+    return backend, backend.device, backend.config
+
+
+# Runs forward passes on a dummy tensor of the configured shape and returns the duration of each pass in seconds.
+def run_dummy_inference(model, device, config, iterations):
+    shape = [1] + list(config["shape"][1:])
+    dummy_input = torch.zeros(shape, dtype=torch.float32, device=device)
+    durations = []
+    with torch.inference_mode():
+        for _ in range(iterations):
+            start_time = time.perf_counter()
+            model(dummy_input)
+            if device.type == "cuda":
+                torch.cuda.synchronize()
+            durations.append(time.perf_counter() - start_time)
+    return durations
+
+
+# Loads the model and runs warm-up passes before any ultrasound frame arrives, so the first frame does not
+# pay for loading, device transfer and JIT optimisation. Prints a breakdown of the startup timings.
+def prepare_model(args):
+    start_time = time.perf_counter()
+    model, device, config = load_model(args)
+    load_time = time.perf_counter() - start_time
+
+    warmup_durations = run_dummy_inference(model, device, config, args.warmup_iterations)
+    steady_durations = np.asarray(run_dummy_inference(model, device, config, args.profile_iterations)) * 1000
+
+    print(f"Model loaded with {model.name} on {device} in {load_time * 1000:.1f} ms (input shape {config['shape']})")
+    if warmup_durations:
+        print(f"Warm-up: {len(warmup_durations)} passes in {sum(warmup_durations) * 1000:.1f} ms, "
+              f"first pass {warmup_durations[0] * 1000:.1f} ms")
+    if len(steady_durations):
+        print(f"Steady state: mean {steady_durations.mean():.1f} ms, "
+              f"median {np.median(steady_durations):.1f} ms, max {steady_durations.max():.1f} ms")
+    return model, device, config
+
+
+# Sends queued messages to Slicer. Blocking sends only hold up this thread.
+def send_loop(output_server, send_queue, stats, stop_event):
+    while not stop_event.is_set():
+        try:
+            received_time, message = send_queue.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        start_time = time.perf_counter()
+        output_server.send_message(message, wait=True)
+        stats.add_latency("send", time.perf_counter() - start_time)
+        if message.message_type == "IMAGE":
+            stats.add_latency("end to end", time.perf_counter() - received_time)
+
+
+# Runs the client as a three-stage pipeline (receive, inference, send) connected by bounded queues
+# that only keep the newest items. Stale frames are dropped instead of piling up latency.
+def run_client(args):
+    model, device, config = prepare_model(args)
+
+    input_client = pyigtl.OpenIGTLinkClient(host=args.host, port=args.input_port)
+    output_server = pyigtl.OpenIGTLinkServer(port=args.output_port)
+
+    image_queues = {device_name: LatestQueue(args.queue_size) for device_name in args.input_device_name}
+    send_queue = LatestQueue(max(args.queue_size, 8) * len(image_queues))
+    image_transforms = {}
+    stats = PipelineStats(args.stats_interval)
+    stop_event = threading.Event()
+
+    threads = [
+        threading.Thread(target=receive_loop,
+                         args=(input_client, get_output_device_names(args), image_queues, send_queue, image_transforms,
+                               stop_event),
+                         name="receiver", daemon=True),
+        threading.Thread(target=inference_loop,
+                         args=(args, model, device, config, image_queues, send_queue, image_transforms, stats,
+                               stop_event),
+                         name="inference", daemon=True),
+        threading.Thread(target=send_loop, args=(output_server, send_queue, stats, stop_event),
+                         name="sender", daemon=True),
+    ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        while all(thread.is_alive() for thread in threads):
+            time.sleep(0.1)
+            queues = {f"{name} image": image_queue for name, image_queue in image_queues.items()}
+            queues["send"] = send_queue
+            stats.report(queues)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_event.set()
+        for thread in threads:
+            thread.join(timeout=1.0)
+        input_client.stop()
+        output_server.stop()
 
 
 def preprocess_input(image, input_size):
@@ -97,6 +568,267 @@ def postprocess_prediction(prediction, original_size):
     return prediction
 
 
+# Clamps a region of interest (x, y, width, height) to an image of the given size.
+def clamp_roi(roi, width, height):
+    x, y, roi_width, roi_height = roi
+    x_min, y_min = max(0, x), max(0, y)
+    x_max, y_max = min(width, x + roi_width), min(height, y + roi_height)
+    if x_max <= x_min or y_max <= y_min:
+        raise ValueError(f"Region of interest x, y, width, height = {roi} is outside the {width}x{height} image")
+    return (x_min, y_min, x_max - x_min, y_max - y_min)
+
+
+# Finds the region of interest of an ultrasound device as the bounding box of pixels that are nonzero in any
+# of the first frames. Everything outside the fan is black, so cropping to it saves resize and inference work.
+class RoiDetector:
+    def __init__(self, frame_count, threshold=0, margin=4):
+        self.frame_count = frame_count
+        self.threshold = threshold
+        self.margin = margin
+        self.roi = None
+        self._maximum = None
+        self._frames_seen = 0
+
+    # Adds a (1, height, width) frame. Returns True once the region of interest is known.
+    def update(self, image):
+        if self._maximum is None or self._maximum.shape != image.shape[1:]:
+            self._maximum = np.array(image[0])
+            self._frames_seen = 0
+        else:
+            np.maximum(self._maximum, image[0], out=self._maximum)
+        self._frames_seen += 1
+        if self._frames_seen < self.frame_count:
+            return False
+
+        height, width = self._maximum.shape
+        rows = np.flatnonzero((self._maximum > self.threshold).any(axis=1))
+        columns = np.flatnonzero((self._maximum > self.threshold).any(axis=0))
+        if len(rows) == 0:
+            self.roi = (0, 0, width, height)
+        else:
+            x_min = max(0, columns[0] - self.margin)
+            y_min = max(0, rows[0] - self.margin)
+            x_max = min(width, columns[-1] + 1 + self.margin)
+            y_max = min(height, rows[-1] + 1 + self.margin)
+            self.roi = (int(x_min), int(y_min), int(x_max - x_min), int(y_max - y_min))
+        self._maximum = None
+        return True
+
+
+# Decides whether a frame moved enough since the last inferred frame to be worth running the model on. Image
+# motion is the mean absolute difference of small thumbnails. Transform motion is the translation and rotation
+# between image transforms, with the pixel spacing removed from the rotation part. Only the enabled criteria
+# (threshold > 0) are checked, and every max_skipped frames inference runs anyway.
+class MotionGate:
+    THUMBNAIL_SIZE = (64, 64)
+
+    def __init__(self, image_threshold=0.0, translation_threshold=0.0, rotation_threshold=0.0, max_skipped=10):
+        self.image_threshold = image_threshold
+        self.translation_threshold = translation_threshold
+        self.rotation_threshold = rotation_threshold
+        self.max_skipped = max_skipped
+        self.cached_prediction = None
+        self.skipped = 0
+        self._thumbnail = None
+        self._transform = None
+
+    def _make_thumbnail(self, image):
+        return cv2.resize(image[0], self.THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32)
+
+    @staticmethod
+    def _transform_motion(previous, current):
+        translation = np.linalg.norm(current[:3, 3] - previous[:3, 3])
+        previous_rotation = previous[:3, :3] / np.linalg.norm(previous[:3, :3], axis=0)
+        current_rotation = current[:3, :3] / np.linalg.norm(current[:3, :3], axis=0)
+        cos_angle = (np.trace(previous_rotation.T @ current_rotation) - 1) / 2
+        return translation, np.degrees(np.arccos(np.clip(cos_angle, -1.0, 1.0)))
+
+    def should_skip(self, image, transform=None):
+        if self.cached_prediction is None or self.skipped >= self.max_skipped:
+            return False
+        if self.cached_prediction.shape[1:] != image.shape[1:]:
+            return False
+        if self.image_threshold > 0:
+            difference = np.abs(self._make_thumbnail(image) - self._thumbnail).mean()
+            if difference >= self.image_threshold:
+                return False
+        if self.translation_threshold > 0 or self.rotation_threshold > 0:
+            if transform is None or self._transform is None:
+                return False
+            translation, rotation = self._transform_motion(self._transform, transform)
+            if self.translation_threshold > 0 and translation >= self.translation_threshold:
+                return False
+            if self.rotation_threshold > 0 and rotation >= self.rotation_threshold:
+                return False
+        self.skipped += 1
+        return True
+
+    def update(self, image, transform, prediction):
+        if self.image_threshold > 0:
+            self._thumbnail = self._make_thumbnail(image)
+        self._transform = transform
+        self.cached_prediction = prediction
+        self.skipped = 0
+
+
+# Reuses preallocated buffers for resizing frames to the model input and prediction masks back to the image
+# size. Everything runs in float32 and the uint8 mask is written straight into a reusable output buffer.
+# Like postprocess_prediction, the float map is resized before it is cast to uint8, so masks match the original.
+# Input buffers are pinned when running on CUDA so host to device copies can be asynchronous.
+# With a region of interest (x, y, width, height) only the crop is resized, and the mask is pasted back into
+# an output buffer that is zero outside the region.
+class FrameProcessor:
+    def __init__(self, input_size, device, max_batch_size=1, output_buffer_count=2):
+        self.input_size = input_size
+        self.device = device
+        self.output_buffer_count = max(1, output_buffer_count)
+        self._pin_memory = device.type == "cuda"
+        self._resized_input = np.empty((input_size, input_size), dtype=np.uint8)
+        self._allocate_input(max(1, max_batch_size))
+        self._allocate_prediction((input_size, input_size))
+        self._output_buffers = {}
+        self._output_index = {}
+
+    def _allocate_input(self, batch_size):
+        self.input_tensor = torch.empty((batch_size, 1, self.input_size, self.input_size), dtype=torch.float32,
+                                        pin_memory=self._pin_memory)
+        self.input_array = self.input_tensor.numpy()
+
+    def _allocate_prediction(self, shape):
+        self.prediction_tensor = torch.empty(shape, dtype=torch.float32, pin_memory=self._pin_memory)
+        self.prediction_array = self.prediction_tensor.numpy()
+        self._prediction_scaled = np.empty(shape, dtype=np.float32)
+        self._resized_predictions = {}
+
+    def _resized_prediction_buffer(self, width, height):
+        buffer = self._resized_predictions.get((width, height))
+        if buffer is None:
+            buffer = np.empty((height, width), dtype=np.float32)
+            self._resized_predictions[(width, height)] = buffer
+        return buffer
+
+    # Output buffers are zeroed once when allocated. Only the region of interest is ever written, so the
+    # area outside it stays zero as long as buffers are kept per shape and region.
+    def _next_output_buffer(self, shape, roi, key=None):
+        key = (shape, roi, key)
+        buffers = self._output_buffers.get(key)
+        if buffers is None:
+            buffers = [np.zeros(shape, dtype=np.uint8) for _ in range(self.output_buffer_count)]
+            self._output_buffers[key] = buffers
+            self._output_index[key] = 0
+        index = self._output_index[key]
+        self._output_index[key] = (index + 1) % len(buffers)
+        return buffers[index]
+
+    # Resizes a list of (1, height, width) images, cropped to their region of interest if given, into the input
+    # buffer and returns the batch tensor on the device
+    def preprocess(self, images, rois=None):
+        if len(images) > self.input_tensor.shape[0]:
+            self._allocate_input(len(images))
+        rois = rois or [None] * len(images)
+        size = (self.input_size, self.input_size)
+        for index, (image, roi) in enumerate(zip(images, rois)):
+            source = image[0]
+            if roi is not None:
+                x, y, width, height = roi
+                source = source[y:y + height, x:x + width]
+            target = self.input_array[index, 0]
+            if image.dtype == np.uint8:
+                cv2.resize(source, size, dst=self._resized_input)  # default is bilinear
+                np.multiply(self._resized_input, np.float32(1 / 255), out=target, dtype=np.float32)
+            else:
+                np.multiply(cv2.resize(source, size), np.float32(1 / 255), out=target, dtype=np.float32,
+                            casting="unsafe")
+        return self.input_tensor[:len(images)].to(self.device, non_blocking=True)
+
+    # Converts a single-channel probability map on the device to a (1, height, width) uint8 mask of original_size.
+    # With a region of interest the mask is resized to the region and the rest of the output stays zero.
+    # Masks with different keys never share output buffers.
+    def postprocess(self, prediction, original_size, roi=None, key=None):
+        if tuple(prediction.shape) != tuple(self.prediction_tensor.shape):
+            self._allocate_prediction(tuple(prediction.shape))
+        self.prediction_tensor.copy_(prediction.detach())
+        np.multiply(self.prediction_array, np.float32(255), out=self._prediction_scaled)
+        output = self._next_output_buffer((1, original_size[1], original_size[2]), roi, key)
+        if roi is None:
+            x, y, width, height = 0, 0, original_size[2], original_size[1]
+        else:
+            x, y, width, height = roi
+        resized = self._resized_prediction_buffer(width, height)
+        cv2.resize(self._prediction_scaled, (width, height), dst=resized)
+        np.copyto(output[0, y:y + height, x:x + width], resized, casting="unsafe")
+        return output
+
+
+# Measures time and NumPy memory allocated per frame for the original and the preallocated processing paths.
+# Torch allocations are not seen by tracemalloc, so only the NumPy/OpenCV side is reported as allocated memory.
+def benchmark_processing(args):
+    _, device, config = load_model(args)
+    input_size = config["shape"][-1]
+    height, width = args.benchmark_processing
+    iterations = max(1, args.profile_iterations)
+    image = np.random.randint(0, 256, (1, height, width), dtype=np.uint8)
+    probabilities = torch.softmax(torch.rand((1, 2, input_size, input_size), device=device), dim=1)
+    processor = FrameProcessor(input_size, device)
+
+    def run_original():
+        preprocess_input(image, input_size).to(device)
+        return postprocess_prediction(probabilities, image.shape)
+
+    def run_preallocated():
+        processor.preprocess([image])
+        return processor.postprocess(probabilities[0, 1], image.shape)
+
+    print(f"Processing {height}x{width} frames for a {input_size}x{input_size} model on {device}")
+    for name, run in (("original", run_original), ("preallocated", run_preallocated)):
+        run()  # first call allocates the reusable buffers
+        allocated = []
+        durations = []
+        tracemalloc.start()
+        for _ in range(iterations):
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            start_time = time.perf_counter()
+            run()
+            durations.append(time.perf_counter() - start_time)
+            allocated.append(tracemalloc.get_traced_memory()[1] - baseline)
+        tracemalloc.stop()
+        print(f"{name}: {np.mean(durations) * 1000:.2f} ms per frame, "
+              f"{np.mean(allocated) / 1024:.1f} KiB allocated per frame")
+    difference = np.abs(run_original().astype(np.int16) - run_preallocated().astype(np.int16)).max()
+    print(f"Maximum per-pixel difference between original and preallocated masks: {difference}")
+
+
+# Times every backend variant on the same model and prints a side-by-side report of steady-state latencies.
+def compare_backends(args):
+    variants = [("torchscript", False), ("onnxruntime", False), ("onnxruntime", True)]
+    results = []
+    for backend_name, quantize in variants:
+        label = backend_name + (" int8" if quantize else "")
+        try:
+            start_time = time.perf_counter()
+            model, device, config = load_model(args, backend_name, quantize)
+            load_time = time.perf_counter() - start_time
+        except Exception as error:
+            print(f"{label}: skipped ({error})")
+            continue
+        run_dummy_inference(model, device, config, args.warmup_iterations)
+        durations = np.asarray(run_dummy_inference(model, device, config, max(1, args.profile_iterations))) * 1000
+        results.append((label, load_time * 1000, durations))
+
+    threads = f"intra-op threads {args.intra_op_threads or 'default'}, inter-op threads {args.inter_op_threads or 'default'}"
+    print(f"Backend comparison ({threads})")
+    print(f"{'backend':<18}{'load ms':>10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'FPS':>8}")
+    for label, load_time, durations in results:
+        print(f"{label:<18}{load_time:>10.1f}{durations.mean():>10.2f}{np.percentile(durations, 50):>10.2f}"
+              f"{np.percentile(durations, 95):>10.2f}{1000 / durations.mean():>8.1f}")
+
+
 if __name__ == "__main__":
     args = parse_args()
-    run_client(args)
\ No newline at end of file
+    if args.compare_backends:
+        compare_backends(args)
+    elif args.benchmark_processing:
+        benchmark_processing(args)
+    else:
+        run_client(args)
\ No newline at end of file
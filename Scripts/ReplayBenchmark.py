@@ -0,0 +1,196 @@
+"""
+Measures the throughput of RealtimeInference.py without a live PLUS server. Recorded ultrasound frames and their
+ImageToReference transforms are played back through a local OpenIGTLink server that stands in for PLUS, and the
+predictions sent back by the inference client are timed.
+Arguments:
+    sequence: recorded frames. Either a PLUS/IGSIO sequence metafile (.mha, e.g. a saved UltrasoundSequenceBrowser
+        recording), a .npy stack of shape (frames, height, width), or a .npz with "images" and optional "transforms"
+    rate: playback rate in frames per second
+    repeat: number of times the sequence is played back
+    model: if given, RealtimeInference.py is launched with this model. Unknown arguments are passed on to it.
+        Otherwise an already running inference client is expected.
+    input port: port the inference client listens to (the stand-in PLUS server)
+    output port: port the inference client sends predictions to
+"""
+
+import argparse
+import subprocess
+import sys
+import time
+import zlib
+import numpy as np
+from pathlib import Path
+import pyigtl
+
+
+ROOT = Path(__file__).parent.resolve()
+
+METAIMAGE_TYPES = {
+    "MET_UCHAR": np.uint8,
+    "MET_CHAR": np.int8,
+    "MET_USHORT": np.uint16,
+    "MET_SHORT": np.int16,
+    "MET_FLOAT": np.float32,
+}
+
+
+# Parse command line arguments
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sequence", type=str, required=True)
+    parser.add_argument("--rate", type=float, default=50.0)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--model", type=str)
+    parser.add_argument("--input-device-name", type=str, default="Image_Image")
+    parser.add_argument("--output-device-name", type=str, default="Prediction")
+    parser.add_argument("--transform-name", type=str, default="ImageToReference")
+    parser.add_argument("--input-port", type=int, default=18944)
+    parser.add_argument("--output-port", type=int, default=18945)
+    parser.add_argument("--connect-timeout", type=float, default=60.0)
+    parser.add_argument("--drain-time", type=float, default=2.0)
+    return parser.parse_known_args()
+
+
+# Reads a PLUS/IGSIO sequence metafile. Returns images of shape (frames, 1, height, width) and the list of
+# 4x4 transforms named transform_name for each frame (None for frames without a valid transform).
+def load_sequence_metafile(path, transform_name):
+    header = {}
+    with open(path, "rb") as file:
+        while True:
+            line = file.readline()
+            if not line:
+                raise ValueError(f"No ElementDataFile found in {path}")
+            key, _, value = line.decode("latin-1").partition("=")
+            header[key.strip()] = value.strip()
+            if key.strip() == "ElementDataFile":
+                break
+        if header["ElementDataFile"] != "LOCAL":
+            raise ValueError("Only sequence files with LOCAL element data are supported")
+        data = file.read()
+
+    width, height, frame_count = [int(size) for size in header["DimSize"].split()[:3]]
+    if header.get("CompressedData", "False") == "True":
+        data = zlib.decompress(data)
+    dtype = METAIMAGE_TYPES[header["ElementType"]]
+    images = np.frombuffer(data, dtype=dtype, count=width * height * frame_count)
+    images = images.reshape(frame_count, 1, height, width)
+
+    transforms = []
+    for frame in range(frame_count):
+        prefix = f"Seq_Frame{frame:04d}_{transform_name}Transform"
+        matrix = header.get(prefix)
+        if matrix is None or header.get(prefix + "Status", "OK") != "OK":
+            transforms.append(None)
+        else:
+            transforms.append(np.array(matrix.split(), dtype=np.float64).reshape(4, 4))
+    return images, transforms
+
+
+# Loads recorded frames from a sequence metafile, .npy or .npz file
+def load_frames(path, transform_name):
+    path = Path(path)
+    if path.suffix == ".mha":
+        return load_sequence_metafile(path, transform_name)
+    if path.suffix == ".npz":
+        data = np.load(path)
+        images = data["images"]
+        transforms = list(data["transforms"]) if "transforms" in data else [None] * len(images)
+    else:
+        images = np.load(path, mmap_mode="r")
+        transforms = [None] * len(images)
+    if images.ndim == 3:
+        images = images[:, np.newaxis, :, :]
+    return images, transforms
+
+
+# Starts RealtimeInference.py in a separate process, passing on any arguments this script does not know about
+def launch_client(args, client_args):
+    command = [sys.executable, str(ROOT / "RealtimeInference.py"),
+               "--model", args.model,
+               "--input-device-name", args.input_device_name,
+               "--output-device-name", args.output_device_name,
+               "--input-port", str(args.input_port),
+               "--output-port", str(args.output_port)] + client_args
+    return subprocess.Popen(command)
+
+
+def wait_for_connection(connections, timeout):
+    deadline = time.perf_counter() + timeout
+    while not all(connection.is_connected() for connection in connections):
+        if time.perf_counter() > deadline:
+            raise TimeoutError("Inference client did not connect in time")
+        time.sleep(0.1)
+
+
+# Plays back the frames at the configured rate and collects the latency of every prediction received back.
+# Latency is measured from the timestamp the frame was sent with, which the inference client keeps.
+def replay(args, images, transforms, server, client):
+    frame_interval = 1.0 / args.rate
+    transform_name = args.transform_name
+    latencies = []
+    sent_count = 0
+
+    def collect_predictions():
+        now = time.time()
+        for message in client.get_latest_messages():
+            if message.message_type == "IMAGE" and message.device_name == args.output_device_name:
+                latencies.append(now - message.timestamp)
+
+    start_time = time.perf_counter()
+    for _ in range(args.repeat):
+        for image, transform in zip(images, transforms):
+            next_send_time = start_time + sent_count * frame_interval
+            while time.perf_counter() < next_send_time:
+                collect_predictions()
+                time.sleep(min(0.001, max(0.0, next_send_time - time.perf_counter())))
+            timestamp = time.time()
+            if transform is not None:
+                server.send_message(pyigtl.TransformMessage(transform, device_name=transform_name,
+                                                            timestamp=timestamp), wait=True)
+            server.send_message(pyigtl.ImageMessage(np.ascontiguousarray(image), device_name=args.input_device_name,
+                                                    timestamp=timestamp), wait=True)
+            sent_count += 1
+    playback_time = time.perf_counter() - start_time
+
+    drain_deadline = time.perf_counter() + args.drain_time
+    while time.perf_counter() < drain_deadline:
+        collect_predictions()
+        time.sleep(0.001)
+    return sent_count, playback_time, np.asarray(latencies)
+
+
+def print_report(sent_count, playback_time, latencies):
+    received_count = len(latencies)
+    print(f"Sent {sent_count} frames in {playback_time:.1f} s ({sent_count / playback_time:.1f} FPS)")
+    print(f"Received {received_count} predictions ({received_count / playback_time:.1f} FPS achieved), "
+          f"{sent_count - received_count} frames dropped")
+    if received_count:
+        latencies = latencies * 1000
+        percentiles = np.percentile(latencies, [50, 90, 95, 99])
+        print(f"End-to-end latency: mean {latencies.mean():.1f} ms, p50 {percentiles[0]:.1f} ms, "
+              f"p90 {percentiles[1]:.1f} ms, p95 {percentiles[2]:.1f} ms, p99 {percentiles[3]:.1f} ms, "
+              f"max {latencies.max():.1f} ms")
+
+
+def run_benchmark(args, client_args):
+    images, transforms = load_frames(args.sequence, args.transform_name)
+    print(f"Loaded {len(images)} frames of size {images.shape[2]}x{images.shape[3]} from {args.sequence}")
+
+    server = pyigtl.OpenIGTLinkServer(port=args.input_port)
+    client = pyigtl.OpenIGTLinkClient(host="127.0.0.1", port=args.output_port)
+    process = launch_client(args, client_args) if args.model else None
+    try:
+        wait_for_connection([server, client], args.connect_timeout)
+        sent_count, playback_time, latencies = replay(args, images, transforms, server, client)
+        print_report(sent_count, playback_time, latencies)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        client.stop()
+        server.stop()
+
+
+if __name__ == "__main__":
+    args, client_args = parse_args()
+    run_benchmark(args, client_args)